@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+# Maximum time to compute and render one chart, in seconds
+RENDER_JOB_TIMEOUT = float(os.environ.get('RENDER_JOB_TIMEOUT', 60))
+# Worker processes, defaults to the number of cores available
+RENDER_PROCESSES = int(os.environ.get('RENDER_PROCESSES', 0)) or None
+# Time allowed to a new worker to start and warm up the renderer, on top of the job timeout, in seconds
+RENDER_WORKER_START_TIMEOUT = float(os.environ.get('RENDER_WORKER_START_TIMEOUT', 30))
+
+@dataclass
+class RenderResult:
+    """
+    Outcome of one chart of a batch.
+
+    Attributes:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - period: str
+        Period of the chart
+    - currency_symbol: str
+        Symbol for ticker currency
+    - png: bytes
+        PNG image of the chart, None if the job failed
+    - error: str
+        Reason of the failure, None if the job succeeded
+    - duration: float
+        Time spent by the worker on the job, in seconds
+    """
+    ticker: str
+    period: str
+    currency_symbol: str
+    png: bytes = None
+    error: str = None
+    duration: float = None
+
+def _on_alarm(signum, frame):
+    raise TimeoutError('Render job timed out')
+
+def _init_worker():
+    # Workers leave interruptions to the parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, _on_alarm)
+    from render import warm_renderer
+    warm_renderer()
+
+def _render_job(ticker: str, period: str, currency_symbol: str, timeout: float) -> RenderResult:
+    from utils import compute_dividend_chart, render_dividend_chart
+    from render import chart_to_png
+
+    start = time.perf_counter()
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        data = compute_dividend_chart(ticker, period)
+        png = chart_to_png(render_dividend_chart(data, currency_symbol))
+        return RenderResult(ticker, period, currency_symbol, png=png, duration=time.perf_counter() - start)
+    except Exception as e:
+        return RenderResult(ticker, period, currency_symbol, error=f'{type(e).__name__}: {e}', duration=time.perf_counter() - start)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _terminate_workers(executor: ProcessPoolExecutor):
+    # Workers stuck in native code ignore the alarm and shutdown, the pool cannot be used after this
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+
+def render_batch(jobs: list[tuple[str, str, str]], processes: int=RENDER_PROCESSES, timeout: float=RENDER_JOB_TIMEOUT) -> list[RenderResult]:
+    """
+    Compute and render many charts in parallel, in a pool of worker processes.
+    A failing, crashing or hanging job only produces a failed result, other jobs are not affected.
+    Only as many jobs as workers are submitted at a time, so that each job has its own deadline from its submission.
+    Jobs lost with a crashed worker run again alone, a job crashing alone is reported as failed.
+
+    Parameters:
+    ----------
+    - jobs: list[tuple[str, str, str]]
+        (ticker, period, currency symbol) of each chart
+    - processes: int
+        Number of worker processes, defaults to the number of cores
+    - timeout: float
+        Maximum time of one job, in seconds
+
+    Returns:
+    -------
+    - list of RenderResult, in the order of jobs
+    """
+    if not jobs:
+        return []
+    processes = min(processes or os.cpu_count(), len(jobs))
+
+    def failed(i: int, error: str) -> RenderResult:
+        return RenderResult(*jobs[i], error=error)
+
+    results = [None] * len(jobs)
+    waiting = deque(range(len(jobs)))
+    crashed = set()
+    # Workers start from a fresh interpreter: the parent may run threads and an initialized renderer
+    context = multiprocessing.get_context('spawn')
+    while waiting:
+        executor = ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker)
+        # future -> (job index, deadline)
+        running = {}
+        broken = False
+        try:
+            while (waiting or running) and not broken:
+                # Jobs lost in a crash run alone, to find out whether they caused it
+                while waiting and len(running) < processes and not (running and crashed.intersection(
+                    [waiting[0], *(i for i, _ in running.values())]
+                )):
+                    i = waiting.popleft()
+                    future = executor.submit(_render_job, *jobs[i], timeout)
+                    # Jobs stop themselves after timeout, the deadline also covers jobs stuck outside Python
+                    running[future] = (i, time.monotonic() + timeout + RENDER_WORKER_START_TIMEOUT)
+
+                next_deadline = min(deadline for _, deadline in running.values())
+                done, _ = wait(running, timeout=max(0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, _ = running.pop(future)
+                    try:
+                        results[i] = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        if i in crashed:
+                            results[i] = failed(i, 'Render worker crashed')
+                        else:
+                            crashed.add(i)
+                            waiting.appendleft(i)
+                    except Exception as e:
+                        results[i] = failed(i, f'{type(e).__name__}: {e}')
+
+                now = time.monotonic()
+                for future, (i, deadline) in list(running.items()):
+                    if deadline <= now and not future.done():
+                        del running[future]
+                        results[i] = failed(i, 'Render job did not finish in time')
+                        broken = True
+        finally:
+            if broken or running:
+                # Jobs still running are lost with the workers: they run again in a new pool
+                waiting.extendleft(i for i, _ in running.values())
+                _terminate_workers(executor)
+            executor.shutdown(wait=True, cancel_futures=True)
+    return results
@@ -0,0 +1,130 @@
+"""
+Chart pipeline benchmark on synthetic histories: wall time, peak memory and spec size of each stage
+- process: utils.process_dividend_history
+- compute: merge with prices, yields, quantiles and bands
+- spec: Altair chart construction and Vega-Lite spec serialization
+- png: PNG export with vl-convert
+
+Usage (from the repository root):
+    python benchmarks/pipeline.py           # compare to baseline, exit 1 on regression or missing baseline
+    python benchmarks/pipeline.py --record  # store current timings as baseline
+    python benchmarks/pipeline.py --lengths 20y max --frequencies quarterly --no-png
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'pipeline.json')
+# Stages measured in seconds, and slowdowns always tolerated on them: stages of a few milliseconds are within timer noise
+TIMED_STAGES = ['process', 'compute', 'spec', 'png']
+MIN_SLOWDOWN = 0.005
+sys.path.insert(0, ROOT)
+# Never touch the real caches
+os.environ['CACHE_DIR'] = tempfile.mkdtemp()
+
+import utils
+from history_cache import normalize_history
+from render import chart_to_png
+from synthetic import LENGTHS, FREQUENCIES, synthetic_history
+
+def run_stage(func, repeat: int) -> tuple[float, int, object]:
+    """
+    Returns best wall time in seconds, peak traced memory in bytes and the result of func.
+    """
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, peak, result
+
+def benchmark_case(length: str, frequency: str, repeat: int, png: bool) -> dict:
+    # Same compact history as the store serves to the pipeline
+    history = normalize_history(synthetic_history(LENGTHS[length], frequency))
+    stages = {}
+
+    stages['process'], peak, _ = run_stage(lambda: utils.process_dividend_history(history), repeat)
+    stages['process_peak_mb'] = peak / 1e6
+
+    stages['compute'], peak, data = run_stage(lambda: utils._compute_chart_data('SYN', length, history), repeat)
+    stages['compute_peak_mb'] = peak / 1e6
+
+    stages['spec'], peak, spec = run_stage(lambda: json.dumps(utils.render_dividend_chart(data).to_dict()), repeat)
+    stages['spec_peak_mb'] = peak / 1e6
+    stages['spec_size_kb'] = len(spec) / 1e3
+
+    if png:
+        chart = utils.render_dividend_chart(data)
+        stages['png'], _, image = run_stage(lambda: chart_to_png(chart), 1)
+        stages['png_size_kb'] = len(image) / 1e3
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', nargs='+', default=list(LENGTHS), choices=list(LENGTHS))
+    parser.add_argument('--frequencies', nargs='+', default=list(FREQUENCIES), choices=list(FREQUENCIES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-png', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown compared to baseline')
+    parser.add_argument('--record', '--save-baseline', action='store_true', help='store timings of the cases run as their baseline instead of comparing')
+    args = parser.parse_args()
+
+    # Untimed first run: the renderer and altair validators start cold, which would slow down whichever case runs first
+    benchmark_case('20y', 'quarterly', 1, not args.no_png)
+
+    results = {}
+    for length in args.lengths:
+        for frequency in args.frequencies:
+            case = f'{length}/{frequency}'
+            try:
+                results[case] = benchmark_case(length, frequency, args.repeat, not args.no_png)
+            except Exception as e:
+                # Too short histories cannot be charted
+                print(f'{case:<16} error: {e!r}')
+                continue
+            print(f'{case:<16} ' + '  '.join(f'{k}={v:.3f}' for k, v in results[case].items()))
+
+    try:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    except OSError:
+        baseline = {}
+
+    if args.record:
+        # Cases not run keep their previous baseline
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2)
+        print(f'Baseline saved to {BASELINE_PATH}')
+        return
+
+    missing = [case for case in results if case not in baseline]
+    if missing:
+        print(f'No baseline for {", ".join(missing)} in {BASELINE_PATH}, run with --record first.')
+        sys.exit(1)
+
+    regressions = [
+        f'{case} {metric}: {value:.3f} vs {baseline[case][metric]:.3f}'
+        for case, metrics in results.items()
+        for metric, value in metrics.items()
+        if metric in baseline[case]
+        and value > baseline[case][metric] * (1 + args.tolerance) + (MIN_SLOWDOWN if metric in TIMED_STAGES else 0)
+    ]
+    if regressions:
+        print('Regressions:')
+        print('\n'.join(regressions))
+        sys.exit(1)
+    print('No regression.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup time benchmark: measures how long `import main` takes in a fresh interpreter
+and fails when it regresses compared to the stored baseline.
+The gate uses the import time reported by -X importtime, interpreter startup is only printed:
+it varies with the machine load and does not depend on the code.
+
+Usage (from the repository root):
+    python benchmarks/startup.py           # compare to baseline, exit 1 on regression or missing baseline
+    python benchmarks/startup.py --record  # store current timings as baseline
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'startup.json')
+# Slowdown always tolerated, in seconds: the import time of a loaded machine varies by about a tenth of a second
+MIN_SLOWDOWN = 0.1
+
+def measure_import(module: str) -> tuple[float, float, list[tuple[int, str]]]:
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+    -------
+    wall time of the interpreter in seconds, import time of the module in seconds,
+    list of (cumulative import time in us, module) sorted by time
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    modules = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.append((int(parts[1]), parts[2].rstrip()))
+    # The imported module is reported last, once all its imports are done
+    return elapsed, modules[-1][0] / 1e6, sorted(modules, reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown compared to baseline')
+    parser.add_argument('--record', '--save-baseline', action='store_true', help='store timings as the baseline instead of comparing')
+    args = parser.parse_args()
+
+    # First run fills OS and bytecode caches
+    measure_import(args.module)
+    walls, timings = [], []
+    for _ in range(args.runs):
+        wall, import_time, modules = measure_import(args.module)
+        walls.append(wall)
+        timings.append(import_time)
+    # Noise only makes runs slower: the fastest run is the closest to the cost of the code
+    best = min(timings)
+
+    print(f'import {args.module}: best {best:.3f}s over {args.runs} runs (interpreter wall time {min(walls):.3f}s)')
+    print('Slowest imports (cumulative):')
+    for cumulative, module in modules[:10]:
+        print(f'{cumulative / 1e6:8.3f}s {module}')
+
+    if args.record:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({args.module: best}, f, indent=2)
+        print(f'Baseline saved to {BASELINE_PATH}')
+        return
+
+    try:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)[args.module]
+    except (OSError, KeyError):
+        print(f'No baseline for {args.module} in {BASELINE_PATH}, run with --record first.')
+        sys.exit(1)
+
+    budget = baseline * (1 + args.tolerance) + MIN_SLOWDOWN
+    print(f'Baseline {baseline:.3f}s, budget {budget:.3f}s')
+    if best > budget:
+        print('Startup time regression!')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Synthetic price and dividend histories, shaped like yfinance downloads, for offline benchmarks and tests.
+"""
+import numpy as np
+import pandas as pd
+
+LENGTHS = {
+    '1y': 1,
+    '5y': 5,
+    '10y': 10,
+    '20y': 20,
+    'max': 40,
+}
+
+# Business days between two distributions, None for irregular
+FREQUENCIES = {
+    'monthly': 21,
+    'quarterly': 63,
+    'annual': 252,
+    'irregular': None,
+}
+
+def synthetic_history(years: int, frequency: str, seed: int=0, end: str='2026-10-16', tz: str=None) -> pd.DataFrame:
+    """
+    Generate a daily history with a random walk price and growing dividends.
+
+    Parameters:
+    ----------
+    - years: int
+        Length of the history
+    - frequency: str
+        Key of FREQUENCIES
+    - seed: int
+        Random seed, same seed gives the same history
+    - end: str
+        Date of the last bar
+    - tz: str
+        Time zone of the index, like yfinance histories, None for tz-naive dates
+
+    Returns:
+    -------
+    - pd.DataFrame with a Date index and Open, High, Low, Close, Adj Close, Volume, Dividends, Stock Splits columns
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end, periods=years * 252, name='Date', tz=tz)
+    n = len(dates)
+
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, n)))
+
+    step = FREQUENCIES[frequency]
+    if step is None:
+        # Distributions at random intervals, sometimes skipped
+        positions = np.cumsum(rng.integers(15, 130, n // 15))
+        positions = positions[positions < n]
+    else:
+        positions = np.arange(rng.integers(0, step), n, step)
+    per_year = 252 / (step or 63)
+    dividends = np.zeros(n)
+    # Yield around 3%, dividend growing 5% a year
+    dividends[positions] = close[0] * 0.03 / per_year * 1.05 ** (positions / 252)
+
+    return pd.DataFrame({
+        'Open': close,
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.integers(1e5, 1e7, n).astype(float),
+        'Dividends': dividends.round(4),
+        'Stock Splits': 0.0,
+    }, index=dates)
@@ -0,0 +1,98 @@
+import os
+import pickle
+from storage import CACHE_DIR, cache_path, safe_filename, atomic_write_bytes
+from metrics import count
+
+# Maximum size of rendered charts kept on disk, least recently used charts are removed first
+CHART_CACHE_MAX_BYTES = int(os.environ.get('CHART_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+def _chart_prefix(ticker: str, period: str) -> str:
+    return safe_filename(f'{ticker.upper()}_{period}_')
+
+def _chart_path(ticker: str, period: str, data_date: str) -> str:
+    return cache_path('charts', _chart_prefix(ticker, period) + data_date + '.pkl')
+
+def get_cached_chart(ticker: str, period: str, data_date: str) -> tuple[bytes, list[str]]:
+    """
+    Returns a rendered chart and its tweet text, or None if not cached.
+
+    Parameters:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - period: str
+        Period of the chart
+    - data_date: str
+        Date of the last bar of the chart data (YYYY-MM-DD)
+
+    Returns:
+    -------
+    - (PNG image, list of text parts of the tweet) or None
+    """
+    path = _chart_path(ticker, period, data_date)
+    try:
+        with open(path, 'rb') as f:
+            entry = pickle.load(f)
+        # Access time drives eviction
+        os.utime(path)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        count('chart_cache_miss')
+        return None
+    count('chart_cache_hit')
+    return entry['png'], entry['details']
+
+def put_cached_chart(ticker: str, period: str, data_date: str, png: bytes, details: list[str]):
+    """
+    Store a rendered chart and its tweet text, replacing charts of older data for the same ticker and period.
+
+    Parameters:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - period: str
+        Period of the chart
+    - data_date: str
+        Date of the last bar of the chart data (YYYY-MM-DD)
+    - png: bytes
+        PNG image of the chart
+    - details: list[str]
+        Text parts of the tweet
+    """
+    path = _chart_path(ticker, period, data_date)
+    atomic_write_bytes(path, pickle.dumps({'png': png, 'details': details}, protocol=pickle.HIGHEST_PROTOCOL))
+
+    folder = os.path.dirname(path)
+    prefix = _chart_prefix(ticker, period)
+    for name in os.listdir(folder):
+        if name.startswith(prefix) and name.endswith('.pkl') and os.path.join(folder, name) != path:
+            _remove(os.path.join(folder, name))
+    evict_charts()
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def evict_charts(max_bytes: int=CHART_CACHE_MAX_BYTES):
+    """
+    Remove least recently used charts until the cache fits in max_bytes.
+    """
+    folder = os.path.join(CACHE_DIR, 'charts')
+    if not os.path.isdir(folder):
+        return
+    charts = []
+    for name in os.listdir(folder):
+        if name.endswith('.pkl'):
+            try:
+                stat = os.stat(os.path.join(folder, name))
+            except FileNotFoundError:
+                continue
+            charts.append((stat.st_mtime, stat.st_size, os.path.join(folder, name)))
+
+    total = sum(size for _, size, _ in charts)
+    for _, size, path in sorted(charts):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import pandas as pd
+from history_cache import read_entry, ticker_download
+from storage import cache_path, read_json, write_json
+
+# Symbols are checked again after this delay, in seconds
+INDEX_MAX_AGE = float(os.environ.get('DIVIDEND_INDEX_MAX_AGE', 7 * 24 * 60 * 60))
+# A payer must have distributed a dividend within this period
+RECENT_DIVIDEND = pd.Timedelta('365D')
+
+_index_lock = threading.Lock()
+
+def _index_path() -> str:
+    return cache_path('dividend_index.json')
+
+def load_index() -> dict:
+    """
+    Returns the dividend payer index: {symbol: {'checked_at': float, 'payer': bool}}.
+    """
+    return read_json(_index_path(), default={})
+
+def _has_recent_dividend(history: pd.DataFrame, now: pd.Timestamp) -> bool:
+    if history is None or history.empty or 'Dividends' not in history:
+        return False
+    dividends = history.Dividends.dropna()
+    dates = dividends.index[dividends > 0]
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return bool(len(dates)) and dates.max() >= now - RECENT_DIVIDEND
+
+def _download_payers(symbols: list[str], now: pd.Timestamp) -> dict[str, bool]:
+    """
+    Check past year distributions of many symbols with a single bulk request.
+    Symbols without any bar in the response are missing from the result.
+    """
+    import yfinance as yf
+
+    data = yf.download(
+        tickers=symbols,
+        period='1y',
+        interval='1mo',
+        group_by='ticker',
+        actions=True,
+        auto_adjust=False,
+        threads=True,
+        progress=False,
+    )
+    payers = {}
+    for symbol in symbols:
+        history = ticker_download(data, symbol)
+        # Failed downloads are left unknown, to be checked again instead of hiding a payer until the entry expires
+        if not history.empty:
+            payers[symbol] = _has_recent_dividend(history, now)
+    return payers
+
+def refresh_dividend_index(symbols: list[str]):
+    """
+    Rebuild index entries for symbols, from the history store when available,
+    otherwise from a bulk download.
+
+    Parameters:
+    ----------
+    - symbols: list[str]
+        Tickers from yahoo finance
+    """
+    now = pd.Timestamp.now()
+    checked = {}
+    missing = []
+    for symbol in dict.fromkeys(s.upper() for s in symbols):
+        entry = read_entry(symbol)
+        if entry is not None and now - entry['fetched_at'] <= pd.Timedelta(seconds=INDEX_MAX_AGE):
+            checked[symbol] = _has_recent_dividend(entry['history'], now)
+        else:
+            missing.append(symbol)
+    if missing:
+        checked.update(_download_payers(missing, now))
+
+    with _index_lock:
+        index = load_index()
+        index.update({
+            symbol: {'checked_at': time.time(), 'payer': payer}
+            for symbol, payer in checked.items()
+        })
+        write_json(_index_path(), index)
+
+def lookup_dividend_payers(symbols: list[str]) -> set[str]:
+    """
+    Returns the symbols that distributed dividends in the past year.
+    Known symbols are answered from the index, unknown or expired ones are checked together.
+
+    Parameters:
+    ----------
+    - symbols: list[str]
+        Tickers from yahoo finance
+
+    Returns:
+    -------
+    - set of upper case symbols of dividend payers
+    """
+    symbols = {s.upper() for s in symbols}
+    now = time.time()
+    index = load_index()
+    unknown = [
+        symbol for symbol in symbols
+        if symbol not in index or now - index[symbol]['checked_at'] > INDEX_MAX_AGE
+    ]
+    if unknown:
+        refresh_dividend_index(unknown)
+        index = load_index()
+    return {symbol for symbol in symbols if index.get(symbol, {}).get('payer')}
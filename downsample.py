@@ -0,0 +1,112 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Rows kept for a chart, shared by its series: about one per horizontal pixel
+CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 1200))
+# lttb (largest triangle three buckets), weekly (last bar of each week) or none
+DOWNSAMPLE_METHOD = os.environ.get('DOWNSAMPLE_METHOD', 'lttb')
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest triangle three buckets: indices of threshold points keeping the visual shape of a line.
+    First and last points are always kept.
+
+    Parameters:
+    ----------
+    - x: np.ndarray
+        Increasing positions of the points
+    - y: np.ndarray
+        Values of the points
+    - threshold: int
+        Number of points to keep
+
+    Returns:
+    -------
+    - sorted np.ndarray of indices
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Buckets between the first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket, the last point for the last bucket
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Point of the bucket making the largest triangle with the previous selected point and the next average
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+def weekly_indices(dates: np.ndarray) -> np.ndarray:
+    """
+    Indices of the last bar of each week.
+    """
+    weeks = (np.asarray(dates).astype('datetime64[D]').astype(np.int64) + 3) // 7
+    last_in_week = np.empty(len(weeks), dtype=bool)
+    last_in_week[-1:] = True
+    last_in_week[:-1] = weeks[1:] != weeks[:-1]
+    return np.flatnonzero(last_in_week)
+
+def downsample_chart_data(df: pd.DataFrame, series: list[str], keep_extremes: list[str], max_points: int=CHART_MAX_POINTS, method: str=DOWNSAMPLE_METHOD) -> pd.DataFrame:
+    """
+    Reduce the rows of a chart dataset to about max_points, keeping the shape of the series.
+    The first and last rows and the minimum and maximum of keep_extremes columns are always kept.
+
+    Parameters:
+    ----------
+    - df: pd.DataFrame
+        Chart data with a Date column, sorted by date
+    - series: list[str]
+        Columns drawn as lines, the rows selected for each of them are kept
+    - keep_extremes: list[str]
+        Columns whose minimum and maximum rows are kept
+    - max_points: int
+        Number of rows kept, each series selects an equal share of them
+    - method: str
+        lttb, weekly or none
+
+    Returns:
+    -------
+    - pd.DataFrame with a subset of the rows
+    """
+    if method == 'none' or len(df) <= max_points:
+        return df
+
+    if method == 'weekly':
+        indices = [weekly_indices(df.Date.to_numpy())]
+    elif method == 'lttb':
+        x = df.Date.to_numpy().astype('datetime64[D]').astype(np.int64)
+        per_series = max(3, max_points // len(series))
+        indices = [lttb_indices(x, df[column].to_numpy(), per_series) for column in series]
+        # Series moving together select many common rows: scale their share once by the overlap
+        selected = len(np.unique(np.concatenate(indices)))
+        if selected < max_points:
+            per_series = min(max_points, per_series * max_points // selected)
+            indices = [lttb_indices(x, df[column].to_numpy(), per_series) for column in series]
+    else:
+        raise ValueError(f'Unknown downsampling method: {method}')
+
+    indices.append([0, len(df) - 1])
+    for column in keep_extremes:
+        values = df[column].to_numpy()
+        indices.append([np.argmin(values), np.argmax(values)])
+
+    return df.iloc[np.unique(np.concatenate(indices).astype(int))].reset_index(drop=True)
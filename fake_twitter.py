@@ -0,0 +1,192 @@
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from twitter_client import endpoint_key
+
+# Calls allowed per 15 minutes window, endpoints missing here are not limited and send no rate limit headers
+RATE_LIMITS = {
+    'GET statuses/mentions_timeline': 75,
+    'GET favorites/list': 75,
+    'GET lists/statuses': 900,
+    'GET statuses/user_timeline': 900,
+    'POST media/upload': 415,
+}
+WINDOW = 15 * 60
+
+TWITTER_DATE_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+
+class FakeTwitter:
+    """
+    In-memory state of the fake server: pending mentions, published tweets and rate limit windows.
+    """
+    def __init__(self, mentions: int, rate_limits: dict, window: float, list_tweets: int=0):
+        self.rate_limits = rate_limits
+        self.window = window
+        self.windows = {}
+        self.ids = itertools.count(1_000_000)
+        self.lock = threading.Lock()
+        self.tweets = []
+        self.favorites = set()
+        self.mentions = [
+            self.status(f'@DividendChart {ticker} 15y', user_id=i)
+            for i, ticker in zip(range(mentions), itertools.cycle(['$KO', '$PEP', '$JNJ', '$O', '$MMM']))
+        ]
+        self.list_tweets = [self.status(f'Tweet {i} of a list member', user_id=1000 + i % 50) for i in range(list_tweets)]
+
+    def status(self, text: str, user_id: int=1, **fields) -> dict:
+        return {
+            'id': next(self.ids),
+            'created_at': time.strftime(TWITTER_DATE_FORMAT, time.gmtime()),
+            'text': text,
+            'full_text': text,
+            'favorited': False,
+            'in_reply_to_status_id': None,
+            'in_reply_to_user_id': None,
+            'entities': {'symbols': [], 'user_mentions': []},
+            'user': {'id': user_id, 'screen_name': f'user{user_id}', 'followers_count': 0},
+            **fields,
+        }
+
+    def take_call(self, key: str) -> tuple[int, dict]:
+        """
+        Count a call against the window of its endpoint, returns the status code and rate limit headers.
+        """
+        limit = self.rate_limits.get(key)
+        if limit is None:
+            return 200, {}
+        now = time.time()
+        with self.lock:
+            reset, used = self.windows.get(key, (now + self.window, 0))
+            if now >= reset:
+                reset, used = now + self.window, 0
+            status = 200 if used < limit else 429
+            used = min(used + 1, limit)
+            self.windows[key] = (reset, used)
+        return status, {
+            'x-rate-limit-limit': str(limit),
+            'x-rate-limit-remaining': str(limit - used),
+            'x-rate-limit-reset': str(int(reset)),
+        }
+
+    def timeline(self, statuses: list[dict], params: dict) -> list[dict]:
+        """
+        Page of a timeline like Twitter serves it: newest first, after since_id, up to max_id included, count statuses.
+        """
+        since_id = int(params.get('since_id', 0))
+        max_id = int(params.get('max_id', 2 ** 63))
+        page = sorted((s for s in statuses if since_id < s['id'] <= max_id), key=lambda s: s['id'], reverse=True)
+        return [{**s, 'favorited': s['id'] in self.favorites} for s in page[:int(params.get('count', 20))]]
+
+    def answer(self, key: str, params: dict):
+        if key == 'GET favorites/list':
+            return self.timeline([s for s in self.mentions + self.list_tweets if s['id'] in self.favorites], params)
+        if key == 'GET statuses/mentions_timeline':
+            return self.timeline(self.mentions, params)
+        if key == 'GET lists/statuses':
+            return self.timeline(self.list_tweets, params)
+        if key == 'GET statuses/user_timeline':
+            return self.timeline(self.tweets, params)
+        if key == 'POST favorites/create':
+            self.favorites.add(int(params['id']))
+            return self.status('favorited')
+        if key == 'POST media/upload':
+            # Simple uploads and chunked uploads INIT create a media, FINALIZE returns it
+            media_id = int(params['media_id']) if params.get('command') == 'FINALIZE' else next(self.ids)
+            return {'media_id': media_id, 'media_id_string': str(media_id), 'expires_after_secs': 86400}
+        if key == 'POST statuses/update':
+            tweet = self.status(params.get('status', ''), in_reply_to_status_id=params.get('in_reply_to_status_id'))
+            self.tweets.append(tweet)
+            return tweet
+        if key == 'POST 2/tweets':
+            tweet = self.status(params.get('text', ''))
+            self.tweets.append(tweet)
+            return {'data': {'id': str(tweet['id']), 'text': tweet['text']}}
+        return None
+
+def make_handler(twitter: FakeTwitter):
+    class Handler(BaseHTTPRequestHandler):
+        def handle_request(self, method: str):
+            url = urlsplit(self.path)
+            key = endpoint_key(method, url.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                form = json.loads(body or b'{}')
+            elif self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                form = {k: v[-1] for k, v in parse_qs(body.decode()).items()}
+            else:
+                # Multipart media uploads
+                form = {}
+
+            status, headers = twitter.take_call(key)
+            payload = twitter.answer(key, {**query, **form}) if status == 200 else {'errors': [{'code': 88, 'message': 'Rate limit exceeded'}]}
+            if payload is None:
+                status, payload = 404, {'errors': [{'code': 34, 'message': f'Unknown endpoint {key}'}]}
+
+            content = json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.handle_request('GET')
+
+        def do_POST(self):
+            self.handle_request('POST')
+
+    return Handler
+
+def serve(port: int=8080, mentions: int=20, rate_limits: dict=RATE_LIMITS, window: float=WINDOW, list_tweets: int=0) -> ThreadingHTTPServer:
+    """
+    Start a fake Twitter API server in a background thread.
+    Point the bot to it with TWITTER_API_URL=http://localhost:<port>.
+
+    Parameters:
+    ----------
+    - port: int
+        Port to listen on, 0 picks a free port
+    - mentions: int
+        Number of chart requests waiting in the mentions timeline
+    - rate_limits: dict
+        Calls allowed per window for each endpoint key
+    - window: float
+        Duration of rate limit windows, in seconds
+    - list_tweets: int
+        Number of tweets in the timeline of every list
+
+    Returns:
+    -------
+    - ThreadingHTTPServer, with the FakeTwitter state as its twitter attribute
+    """
+    twitter = FakeTwitter(mentions, rate_limits, window, list_tweets)
+    server = ThreadingHTTPServer(('localhost', port), make_handler(twitter))
+    server.twitter = twitter
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Twitter API with rate limits, to run the bot locally.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--mentions', type=int, default=20, help='number of pending chart requests')
+    parser.add_argument('--window', type=float, default=WINDOW, help='rate limit window, in seconds')
+    parser.add_argument('--list-tweets', type=int, default=0, help='number of tweets in list timelines')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.mentions, window=args.window, list_tweets=args.list_tweets)
+    print(f'Fake Twitter API listening on http://localhost:{server.server_port}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,255 @@
+import os
+import pickle
+import re
+import numpy as np
+import pandas as pd
+from storage import cache_path, safe_filename, atomic_write_bytes
+from metrics import stage, count
+
+# Cached histories younger than this are served without any network call
+HISTORY_MAX_AGE = pd.Timedelta(os.environ.get('HISTORY_MAX_AGE', '1h'))
+# Columns kept from downloads: charts only use closing prices and distributions
+HISTORY_DTYPES = {'Close': np.float64, 'Dividends': np.float64}
+HISTORY_COLUMNS = list(HISTORY_DTYPES)
+
+def yahoo_history(ticker: str, period: str=None, start=None) -> pd.DataFrame:
+    """
+    Download daily history from yahoo finance, either for a period or from a start date.
+
+    Parameters:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - period: str
+        Period to collect data from (ytd, 1wk, 1m, 6m, 1y, 10y, ..., max)
+    - start: str or datetime
+        First date to collect, used instead of period when provided
+
+    Returns:
+    -------
+    - pd.DataFrame containing stock historical data
+    """
+    import yfinance as yf
+
+    with stage('yahoo_fetch'):
+        if start is not None:
+            return yf.Ticker(ticker).history(start=start, auto_adjust=False)
+        return yf.Ticker(ticker).history(period=period, auto_adjust=False)
+
+def period_start(period: str, now: pd.Timestamp) -> pd.Timestamp:
+    """
+    Returns the first date covered by a yahoo finance period, None for max.
+    Raises ValueError for periods that cannot be mapped to a date.
+    """
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=now.year, month=1, day=1)
+
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period)
+    if not match:
+        raise ValueError(f'Unsupported period: {period}')
+    value, unit = int(match.group(1)), match.group(2)
+    offset = {
+        'd': pd.DateOffset(days=value),
+        'wk': pd.DateOffset(weeks=value),
+        'mo': pd.DateOffset(months=value),
+        'y': pd.DateOffset(years=value),
+    }[unit]
+    return (now - offset).normalize()
+
+def _naive_dates(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    return index.tz_localize(None) if index.tz is not None else index
+
+def normalize_history(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make histories from different sources comparable and compact:
+    tz-naive sorted daily index named Date, HISTORY_COLUMNS only, with HISTORY_DTYPES, no missing Close.
+    """
+    history = pd.DataFrame(
+        {
+            column: history[column].to_numpy(dtype=dtype) if column in history else np.zeros(len(history), dtype=dtype)
+            for column, dtype in HISTORY_DTYPES.items()
+        },
+        index=pd.DatetimeIndex(_naive_dates(history.index), name='Date'),
+    )
+    # Days without distribution are missing in some sources
+    history['Dividends'] = history.Dividends.fillna(0)
+    # Bars without price would spread NaN through running maxima and sorted yields
+    history = history[history.Close.notna()]
+    history = history[~history.index.duplicated(keep='last')].sort_index()
+    return history
+
+def _entry_path(ticker: str) -> str:
+    return cache_path('history', safe_filename(ticker.upper()) + '.pkl')
+
+def read_entry(ticker: str) -> dict:
+    """
+    Returns the cached entry for a ticker ({history, covered_from, fetched_at}) or None.
+    """
+    try:
+        with open(_entry_path(ticker), 'rb') as f:
+            entry = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    # Prices stored as float32 lost their precision: download them again
+    if entry['history'].Close.dtype == np.float32:
+        return None
+    # Entries stored before histories were made compact
+    if list(entry['history'].columns) != HISTORY_COLUMNS:
+        entry['history'] = normalize_history(entry['history'])
+    return entry
+
+def write_entry(ticker: str, history: pd.DataFrame, covered_from: pd.Timestamp, fetched_at: pd.Timestamp):
+    """
+    Store a full history for a ticker.
+
+    Parameters:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - history: pd.DataFrame
+        Normalized daily history
+    - covered_from: pd.Timestamp
+        First date requested when the history was downloaded (None for max)
+    - fetched_at: pd.Timestamp
+        Time of the most recent download
+    """
+    entry = {
+        'history': history,
+        'covered_from': covered_from,
+        'fetched_at': fetched_at,
+    }
+    atomic_write_bytes(_entry_path(ticker), pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _covers(entry: dict, start: pd.Timestamp) -> bool:
+    if entry['covered_from'] is None:
+        return True
+    return start is not None and entry['covered_from'] <= start
+
+def _append_recent(ticker: str, entry: dict, source, now: pd.Timestamp) -> dict:
+    history = entry['history']
+    last_date = history.index[-1]
+    # Last cached bar may have been collected intraday: download it again
+    download = source(ticker, start=last_date.strftime('%Y-%m-%d'))
+
+    # A split adjusts the whole history: cached bars are no longer valid
+    if 'Stock Splits' in download and (download['Stock Splits'].to_numpy()[_naive_dates(download.index) > last_date] > 0).any():
+        return None
+
+    recent = normalize_history(download)
+    recent = recent[recent.index >= last_date]
+
+    if len(recent):
+        history = pd.concat([history[history.index < recent.index[0]], recent])
+    return {
+        'history': history,
+        'covered_from': entry['covered_from'],
+        'fetched_at': now,
+    }
+
+def load_history(ticker: str, period: str, source=yahoo_history, max_age: pd.Timedelta=HISTORY_MAX_AGE) -> pd.DataFrame:
+    """
+    Returns stock history from the local store, downloading only what is missing.
+    - unknown ticker or period not covered by the store: full download
+    - store older than max_age: download bars after the last cached date and append them
+
+    Parameters:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - period: str
+        Period to collect data from (ytd, 1wk, 1m, 6m, 1y, 10y, ..., max)
+    - source: callable
+        Data source with the signature of yahoo_history
+    - max_age: pd.Timedelta
+        Maximum age of the store before looking for new bars
+
+    Returns:
+    -------
+    - pd.DataFrame with a Date index, Close and Dividends columns (see normalize_history)
+    """
+    now = pd.Timestamp.now()
+    try:
+        start = period_start(period, now)
+    except ValueError:
+        return normalize_history(source(ticker, period=period))
+
+    entry = read_entry(ticker)
+    if entry is not None and _covers(entry, start) and now - entry['fetched_at'] > max_age:
+        entry = _append_recent(ticker, entry, source, now)
+        if entry is not None:
+            write_entry(ticker, **entry)
+
+    if entry is None or not _covers(entry, start):
+        count('history_cache_miss')
+        history = normalize_history(source(ticker, period=period))
+        # Do not store failed downloads
+        if history.empty:
+            return history
+        entry = {'history': history, 'covered_from': start, 'fetched_at': now}
+        write_entry(ticker, **entry)
+    else:
+        count('history_cache_hit')
+
+    history = entry['history']
+    if start is not None:
+        history = history[history.index >= start]
+    return history
+
+def ticker_download(data: pd.DataFrame, ticker: str) -> pd.DataFrame:
+    """
+    Returns the bars of one ticker from a yf.download result, without bars missing a Close price.
+    Empty when the download failed for this ticker.
+    """
+    try:
+        # Single ticker downloads do not have a ticker level in columns
+        history = data[ticker] if isinstance(data.columns, pd.MultiIndex) else data
+        return history.dropna(subset=['Close'])
+    except KeyError:
+        return pd.DataFrame()
+
+def prefetch_histories(tickers: list[str], period: str, chunk_size: int=50) -> list[str]:
+    """
+    Fill the store for many tickers using chunked multi-ticker downloads.
+
+    Parameters:
+    ----------
+    - tickers: list[str]
+        Tickers from yahoo finance
+    - period: str
+        Period to collect data from (ytd, 1wk, 1m, 6m, 1y, 10y, ..., max)
+    - chunk_size: int
+        Number of tickers per bulk request
+
+    Returns:
+    -------
+    - list of tickers that could not be downloaded
+    """
+    import yfinance as yf
+
+    now = pd.Timestamp.now()
+    start = period_start(period, now)
+    tickers = list(dict.fromkeys(tickers))
+    failed = []
+
+    for i in range(0, len(tickers), chunk_size):
+        chunk = tickers[i:i + chunk_size]
+        data = yf.download(
+            tickers=chunk,
+            period=period,
+            group_by='ticker',
+            actions=True,
+            auto_adjust=False,
+            threads=True,
+            progress=False,
+        )
+
+        for ticker in chunk:
+            history = ticker_download(data, ticker)
+            if history.empty:
+                failed.append(ticker)
+                continue
+            write_entry(ticker, normalize_history(history), covered_from=start, fetched_at=now)
+
+    return failed
@@ -1,15 +1,137 @@
+import argparse
 import datetime
 import random
-import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 import tweepy
 import altair as alt
 import os
 import pandas as pd
-import gspread
-from utils import generate_dividend_chart, generate_tweet_ticker_details
+from utils import compute_dividend_chart, render_dividend_chart, generate_tweet_ticker_details, load_ticker_data, normalize_period
+from history_cache import prefetch_histories
+from render import chart_to_png, warm_renderer
+from scheduler import every, daily, weekly, run_forever, Deferred
+from dividend_index import lookup_dividend_payers, refresh_dividend_index
+from tweet_store import fetch_newer, collect_list_timeline, collect_replied_user_ids, mark_favorited
+from mention_log import update_mention_log, top_counts
+from chart_cache import get_cached_chart, put_cached_chart
+from ticker_info import get_ticker_info, purge_ticker_info, get_currency_symbol
+from metrics import operation, stage, count, annotate, submit
+from twitter_client import RateLimiter, RateBudget, BudgetedAPI, BudgetedClient, priority, LOW
+from uploads import upload_png
+from storage import cache_path, read_json, write_json
+from batch_render import render_batch
 
 alt.data_transformers.disable_max_rows()
 
+# Seconds between two checks of new mentions in daemon mode
+MENTION_POLL_INTERVAL = int(os.environ.get('MENTION_POLL_INTERVAL', 60))
+# Number of mentions processed in parallel
+MAX_REPLY_WORKERS = int(os.environ.get('MAX_REPLY_WORKERS', 4))
+# Mentions older than this are not answered, in days
+MENTION_MAX_AGE = datetime.timedelta(days=float(os.environ.get('MENTION_MAX_AGE_DAYS', 7)))
+
+# Twitter list of accounts the bot reacts to
+REACTION_LIST_ID = '1585331746828173340'
+
+# Twitter limits: 300 tweets per 3 hours, 1000 likes per 24 hours
+TWEET_LIMITER = RateLimiter(300, 3 * 60 * 60)
+FAVORITE_LIMITER = RateLimiter(1000, 24 * 60 * 60)
+# Quotas of API endpoints, shared by the v1.1 and v2 clients
+TWITTER_BUDGET = RateBudget()
+
+# Threads used to fetch ticker info while chart history is loaded
+fetch_executor = ThreadPoolExecutor(max_workers=8)
+# Threads uploading charts while tweet texts are written
+upload_executor = ThreadPoolExecutor(max_workers=4)
+
+def generate_chart_and_details(ticker: str, period: str, on_render: Callable[[bytes], None]=None) -> tuple[bytes, list[str]]:
+    """
+    Generate a chart and the matching tweet text.
+    Charts already rendered for the latest data are served from the chart cache.
+    Otherwise, ticker info is fetched while the chart history is loaded and processed, 
+    so that the slowest of both sets the latency instead of their sum.
+
+    Parameters:
+    ----------
+    ticker: str
+        Ticker to generate chart for
+    period: str
+        Time period for generated chart
+    on_render: Callable
+        Called with the PNG image as soon as it is available, before the tweet text is written
+
+    Returns:
+    -------
+    PNG image of the chart, list of text parts of the tweet.
+    """
+    period = normalize_period(period)
+    # Started first so that it overlaps with the history download, ticker info is cached when the chart is
+    info_future = submit(fetch_executor, get_ticker_info, ticker)
+    history = load_ticker_data(ticker, period)
+    data_date = history.index[-1].strftime('%Y-%m-%d') if len(history) else None
+    if data_date and (cached := get_cached_chart(ticker, period, data_date)):
+        if on_render is not None:
+            on_render(cached[0])
+        return cached
+
+    data = compute_dividend_chart(ticker, period, history=history)
+
+    currency_symbol = '$'
+    # Get stock info
+    try:
+        info = info_future.result()
+        currency_symbol = get_currency_symbol(info)
+    except:
+        info = None
+
+    with stage('spec'):
+        chart = render_dividend_chart(data, currency_symbol)
+    png = chart_to_png(chart)
+    if on_render is not None:
+        on_render(png)
+
+    try:
+        details = generate_tweet_ticker_details(info, currency_symbol)
+        info_found = True
+    except:
+        details = [
+            '$' + ticker
+            if ticker[0] != '$'
+            else ticker
+        ]
+        info_found = False
+
+    # Do not keep charts made without ticker info
+    if info_found:
+        put_cached_chart(ticker, period, data_date, png, details)
+    return png, details
+
+def upload_chart_and_details(api: tweepy.API, ticker: str, period: str) -> tuple[int, list[str]]:
+    """
+    Generate a chart and its tweet text, and upload the chart.
+    The upload starts as soon as the chart is rendered, while the tweet text is written and the chart is cached.
+
+    Parameters:
+    ----------
+    api: tweepy.API
+        API object to upload media
+    ticker: str
+        Ticker to generate chart for
+    period: str
+        Time period for generated chart
+
+    Returns:
+    -------
+    media_id of the uploaded chart, list of text parts of the tweet.
+    """
+    uploads = []
+    png, details = generate_chart_and_details(
+        ticker, period,
+        on_render=lambda png: uploads.append(submit(upload_executor, upload_png, api, png))
+    )
+    return uploads[0].result(), details
+
 def dividend_chart_reply_request(api: tweepy.API, tweet: tweepy.models.Status):
     """
     Reply to a bot request: 
@@ -29,43 +151,46 @@ def dividend_chart_reply_request(api: tweepy.API, tweet: tweepy.models.Status):
     Requires update to API v2.
     """
     params = tweet.full_text.split('@DividendChart')[-1].strip().split()
-    try:
-        assert len(params) == 2, 'Wrong number of parameters.'
-        # if len(params) != 2:
-        #     ticker = params[0]
-        #     period = '15y'
-        # else:
-        ticker, period = params
-        ticker = ticker.split('$')[-1]
-        chart = generate_dividend_chart(ticker, period)
-        chart.save('chart.png')
-
-        media = api.media_upload('chart.png')
-
-        # Get stock info
+    with operation('reply', tweet_id=tweet.id):
         try:
-            info = yf.Ticker(ticker).info
-            details = generate_tweet_ticker_details(info)
-        except:
-            if ticker[0] != '$':
-                ticker = '$' + ticker
-            details = [ticker]
-
-        api.update_status(
-            # status=f"Here is your chart @{tweet.author.screen_name}! Ticker: ${ticker}. Period: {period}.",
-            status='\n'.join(details),
-            # filename='chart.png',
-            media_ids=[media.media_id],
-            in_reply_to_status_id=tweet.id,
-            auto_populate_reply_metadata=True
-        )
-    except Exception as e: 
-        print(e)
+            assert len(params) == 2, 'Wrong number of parameters.'
+            # if len(params) != 2:
+            #     ticker = params[0]
+            #     period = '15y'
+            # else:
+            ticker, period = params
+            ticker = ticker.split('$')[-1]
+            annotate(ticker=ticker, period=period)
+            media_id, details = upload_chart_and_details(api, ticker, period)
+
+            TWEET_LIMITER.wait()
+            with stage('post'):
+                api.update_status(
+                    # status=f"Here is your chart @{tweet.author.screen_name}! Ticker: ${ticker}. Period: {period}.",
+                    status='\n'.join(details),
+                    # filename='chart.png',
+                    media_ids=[media_id],
+                    in_reply_to_status_id=tweet.id,
+                    auto_populate_reply_metadata=True
+                )
+        except Deferred:
+            # Left unprocessed, to be answered when the quota resets
+            raise
+        except Exception as e:
+            # Failed requests are still marked as processed by the caller
+            annotate(outcome='failed', error=f'{type(e).__name__}: {e}')
+
+def _reply_cursor_path() -> str:
+    return cache_path('reply_cursor.json')
 
 def reply_to_tweets(api: tweepy.API):
     """
-    Check mentions since most recent fav and generate dividend charts.
+    Check mentions newer than the reply cursor and generate dividend charts.
     Mentions are "fav" to indicated that they have already been processed.
+    Mentions are processed in parallel by a pool of MAX_REPLY_WORKERS threads.
+    Mentions deferred by rate limits are not "fav", the whole task is deferred until the quota resets.
+    The cursor only moves past mentions older than the first deferred one, so that deferred mentions
+    are fetched again on the next run while newer ones, already "fav", are skipped.
 
     Parameters:
     ----------
@@ -76,17 +201,149 @@ def reply_to_tweets(api: tweepy.API):
     ------
     Requires update to API v2.
     """
-    # Get id of the most recent favorited tweet
-    latest_fav = api.get_favorites()[0].id
-
-    # Iterate over recent mentions
-    for tweet in api.mentions_timeline(since_id=latest_fav, tweet_mode='extended'):
-        if not tweet.favorited:
-            print(f'Processing tweet: {tweet.full_text}')
-            # Generate dividend chart
-            dividend_chart_reply_request(api, tweet)
-            # Fav tweet to indicate that processing is done
-            api.create_favorite(tweet.id)
+    cursor = read_json(_reply_cursor_path())
+    if cursor is None:
+        # First run: start from the most recent favorited tweet
+        favorites = api.get_favorites(count=1)
+        cursor = {'since_id': favorites[0].id if favorites else None}
+
+    def process(tweet: tweepy.models.Status):
+        print(f'Processing tweet: {tweet.full_text}')
+        # Generate dividend chart
+        dividend_chart_reply_request(api, tweet)
+        # Fav tweet to indicate that processing is done
+        FAVORITE_LIMITER.wait()
+        api.create_favorite(tweet.id)
+
+    # Iterate over recent mentions, each tweet is handled once
+    mentions = fetch_newer(
+        lambda **kwargs: api.mentions_timeline(count=200, tweet_mode='extended', **kwargs),
+        since_id=cursor['since_id'],
+        oldest=datetime.datetime.now(datetime.timezone.utc) - MENTION_MAX_AGE,
+        max_tweets=float('inf'),
+    )
+    pending = {}
+    for tweet in mentions:
+        if not tweet['favorited'] and tweet['id'] not in pending:
+            pending[tweet['id']] = tweepy.models.Status.parse(api, tweet)
+
+    with ThreadPoolExecutor(max_workers=MAX_REPLY_WORKERS) as executor:
+        futures = {executor.submit(process, tweet): tweet for tweet in pending.values()}
+    deferred = None
+    deferred_ids = []
+    for future, tweet in futures.items():
+        error = future.exception()
+        if isinstance(error, Deferred):
+            deferred = error if deferred is None else max(deferred, error, key=lambda e: e.until)
+            deferred_ids.append(tweet.id)
+        elif error:
+            print(f'Failed to process tweet {tweet.id}: {error}')
+
+    # Move past every mention older than the first deferred one
+    done = [t['id'] for t in mentions if not deferred_ids or t['id'] < min(deferred_ids)]
+    write_json(_reply_cursor_path(), {'since_id': max(done, default=cursor['since_id'])})
+    if deferred:
+        raise deferred
+
+def load_ticker_list() -> pd.DataFrame:
+    """
+    Load the ticker universe from the Google Sheet, or from the backup csv file.
+
+    Returns:
+    -------
+    pd.DataFrame with a Ticker column.
+    """
+    try:
+        import gspread
+
+        gc = gspread.service_account(filename='sheets-api-credentials.json')
+        # gc = gspread.service_account_from_dict(os.environ('sheets-api-credentials'))
+        sheet = gc.open_by_key('1WLR9XICmKZi0QHneZck8yWNVatwssSEv1Qs_oOCVGRg')
+        worksheet = sheet.worksheet('Stocks')
+        tickers = pd.DataFrame(worksheet.get_all_records())
+    except Exception as e:
+        print(e)
+        print('Using ticker list')
+        tickers = pd.read_csv(os.path.join('data', 'ticker_list.csv'))
+    return tickers
+
+def prefetch_ticker_universe(period: str):
+    """
+    Download histories of the whole ticker universe into the local store, in bulk.
+    Charts generated afterwards read from the store instead of downloading.
+    The dividend payer index is refreshed and expired ticker info is removed from the cache.
+
+    Parameters:
+    ----------
+    period: str
+        Time period to download
+    """
+    tickers = load_ticker_list()['Ticker'].str.strip().tolist()
+    failed = prefetch_histories(tickers, period)
+    refresh_dividend_index(tickers)
+    purge_ticker_info()
+    print(f'Prefetched {len(tickers) - len(failed)}/{len(tickers)} tickers.')
+    if failed:
+        print(f'Failed: {failed}')
+
+def warm_chart_cache(periods: list[str]):
+    """
+    Render charts of the whole ticker universe for the standard periods, 
+    so that posts and replies only have to upload them.
+    Charts missing from the chart cache are rendered in a pool of processes, using every core.
+
+    Parameters:
+    ----------
+    periods: list[str]
+        Time periods of the charts
+    """
+    tickers = load_ticker_list()['Ticker'].str.strip().tolist()
+    periods = [normalize_period(period) for period in periods]
+
+    with operation('warm', tickers=len(tickers), periods=periods):
+        # Charts of the latest data already rendered are skipped
+        missing = []
+        for ticker in tickers:
+            for period in periods:
+                try:
+                    history = load_ticker_data(ticker, period)
+                except Exception as e:
+                    print(f'Failed to load {ticker} {period}: {e}')
+                    continue
+                if len(history):
+                    data_date = history.index[-1].strftime('%Y-%m-%d')
+                    if get_cached_chart(ticker, period, data_date) is None:
+                        missing.append((ticker, period, data_date))
+
+        symbols = list(dict.fromkeys(ticker for ticker, _, _ in missing))
+        infos = dict(zip(symbols, fetch_executor.map(_ticker_info_or_none, symbols)))
+
+        # Charts are only cached with ticker info, see generate_chart_and_details
+        jobs = []
+        for ticker, period, data_date in missing:
+            try:
+                currency_symbol = get_currency_symbol(infos[ticker])
+                details = generate_tweet_ticker_details(infos[ticker], currency_symbol)
+            except Exception:
+                continue
+            jobs.append((ticker, period, data_date, currency_symbol, details))
+
+        with stage('render'):
+            results = render_batch([(ticker, period, currency_symbol) for ticker, period, _, currency_symbol, _ in jobs])
+
+        for (ticker, period, data_date, _, details), result in zip(jobs, results):
+            if result.error:
+                count('render_failures')
+                print(f'Failed to render {ticker} {period}: {result.error}')
+            else:
+                put_cached_chart(ticker, period, data_date, result.png, details)
+        annotate(rendered=sum(result.error is None for result in results), failed=sum(result.error is not None for result in results))
+
+def _ticker_info_or_none(ticker: str) -> dict:
+    try:
+        return get_ticker_info(ticker)
+    except Exception:
+        return None
 
 def random_dividend_chart(api_v1: tweepy.API, api_v2: tweepy.Client, period: str):
     """
@@ -105,53 +362,23 @@ def random_dividend_chart(api_v1: tweepy.API, api_v2: tweepy.Client, period: str
     ------
     Already updated for API v2.
     """
-    # Get random stock
-    try:
-        gc = gspread.service_account(filename='sheets-api-credentials.json')
-        # gc = gspread.service_account_from_dict(os.environ('sheets-api-credentials'))
-        sheet = gc.open_by_key('1WLR9XICmKZi0QHneZck8yWNVatwssSEv1Qs_oOCVGRg')
-        worksheet = sheet.worksheet('Stocks')
-        tickers = pd.DataFrame(worksheet.get_all_records())
-        stock = tickers.sample(1)
-    except Exception as e:
-        print(e)
-        print('Using ticker list')
-        stock = pd.read_csv(os.path.join('data', 'ticker_list.csv')).sample(1)
+    with operation('random_post', period=period), priority(LOW):
+        # Get random stock
+        stock = load_ticker_list().sample(1)
 
-    ticker = stock['Ticker'].str.strip().iloc[0]
+        ticker = stock['Ticker'].str.strip().iloc[0]
+        annotate(ticker=ticker)
 
-    currency_symbol = '$'
-    # Get stock info
-    try:
-        info = yf.Ticker(ticker).info
-        
-        if currency := info.get('currency'):
-            if currency == 'EUR':
-                currency_symbol = '€'
-            elif currency == 'GBP':
-                currency_symbol = '£'
-            elif currency == 'CHF':
-                currency_symbol = 'CHF'
-        details = generate_tweet_ticker_details(info, currency_symbol)
-    except:
-        details = [
-            '$' + ticker
-            if ticker[0] != '$'
-            else ticker
-        ]
-    
-    # Generate chart
-    chart = generate_dividend_chart(ticker, period, currency_symbol)
-    # Save it
-    chart.save('chart.png')
-    # Upload chart
-    media = api_v1.media_upload('chart.png')
+        # Generate chart and ticker details, upload chart
+        media_id, details = upload_chart_and_details(api_v1, ticker, period)
 
-    # Tweet it
-    api_v2.create_tweet(
-        text='\n'.join(details),
-        media_ids=[media.media_id],
-    )
+        # Tweet it
+        TWEET_LIMITER.wait()
+        with stage('post'):
+            api_v2.create_tweet(
+                text='\n'.join(details),
+                media_ids=[media_id],
+            )
 
 def dividend_chart_reply_author(api: tweepy.API, tweet: tweepy.models.Status, ticker: str, period: str):
     """
@@ -172,34 +399,25 @@ def dividend_chart_reply_author(api: tweepy.API, tweet: tweepy.models.Status, ti
     ------
     Requires update to API v2.
     """
-    # Generate chart
-    chart = generate_dividend_chart(ticker, period)
-    # Save it
-    chart.save('chart.png')
-    # Upload chart
-    media = api.media_upload('chart.png')
-    # Get ticker details
-    try:
-        info = yf.Ticker(ticker).info
-        details = generate_tweet_ticker_details(info)
-    except:
-        if ticker[0] != '$':
-            ticker = '$' + ticker
-        details = [ticker]
+    # Generate chart and ticker details, upload chart
+    media_id, details = upload_chart_and_details(api, ticker, period)
     # Tweet it
-    api.update_status(
-        # status=f"Ticker: ${ticker}. Period: {period}.",
-        status='\n'.join(details),
-        media_ids=[media.media_id],
-        in_reply_to_status_id=tweet.id,
-        auto_populate_reply_metadata=True
-    )
+    TWEET_LIMITER.wait()
+    with stage('post'):
+        api.update_status(
+            # status=f"Ticker: ${ticker}. Period: {period}.",
+            status='\n'.join(details),
+            media_ids=[media_id],
+            in_reply_to_status_id=tweet.id,
+            auto_populate_reply_metadata=True
+        )
 
-def get_tweets_from_list(api: tweepy.Client) -> list:
+def get_tweets_from_list(api: tweepy.API) -> list:
     """
     Collect recent tweets from a specific twitter list, for the past 24h.
     Filter out authors recently replied to (past 60 posts), replies to other tweets.
     Sort output by follower count.
+    Only tweets newer than the previous run are downloaded, see tweet_store.
 
     Parameters:
     ----------
@@ -214,52 +432,19 @@ def get_tweets_from_list(api: tweepy.Client) -> list:
     ------
     Requires update to API v2.
     """
-    list_timeline = api.list_timeline(
-        list_id="1585331746828173340",
-        count=200,
-        include_rts=False, 
-    )
-
-    # Init timeline dataframe
-    timeline = pd.json_normalize([t._json for t in list_timeline])
-    timeline['created_at'] = pd.to_datetime(timeline.created_at)
-    timeline['status'] = list_timeline
-
-    while timeline.created_at.min() > timeline.created_at.max() - pd.Timedelta('1D') and len(timeline) < 500:
-        # Get oldest tweet it in current timeline dataframe
-        oldest_tweet_id = timeline[timeline.created_at == timeline.created_at.min()].iloc[0].id
-        # Collect older tweets
-        list_timeline = api.list_timeline(
-            list_id="1585331746828173340",
-            count=200,
-            include_rts=False, 
-            max_id=oldest_tweet_id
-        )
-
-        # Create temporary dataframe with older data
-        _timeline = pd.json_normalize([t._json for t in list_timeline])
-        _timeline['created_at'] = pd.to_datetime(_timeline.created_at)
-        _timeline['status'] = list_timeline
-
-        # Merge dataframes:
-        timeline = pd.concat([timeline, _timeline])
-        timeline = timeline.drop_duplicates(subset=['id'])
-
-    # Get previously posted tweets
-    previous_tweets = api.user_timeline(
-        count=60,
-    )
-    # Get list of user ids replied to in the past 24 tweets
-    previous_tweets_user_ids = {t.in_reply_to_user_id for t in previous_tweets}
-
-    timeline = timeline[
-        ~timeline['user.id'].isin(previous_tweets_user_ids) # Not recently replied to
-        & ~timeline.favorited # No already favorited
-        & timeline.in_reply_to_status_id.isna() # Not a reply to another tweet
-        & timeline['entities.symbols'].apply(len) != 0 # At least one ticker mentioned
+    timeline = collect_list_timeline(api, list_id=REACTION_LIST_ID)
+    # Get list of user ids replied to in the past 60 tweets
+    previous_tweets_user_ids = collect_replied_user_ids(api, count=60)
+
+    timeline = [
+        t for t in timeline
+        if t['user']['id'] not in previous_tweets_user_ids # Not recently replied to
+        and not t['favorited'] # No already favorited
+        and t['in_reply_to_status_id'] is None # Not a reply to another tweet
+        and len(t['entities']['symbols']) != 0 # At least one ticker mentioned
     ]
-    timeline = timeline.sort_values(by='user.followers_count', ascending=False) # Sort by number of followers
-    filtered_tweets = timeline['status'].tolist()
+    timeline.sort(key=lambda t: t['user']['followers_count'], reverse=True) # Sort by number of followers
+    filtered_tweets = [tweepy.models.Status.parse(api, t) for t in timeline]
     return filtered_tweets
 
 def react_to_authors(api: tweepy.API):
@@ -278,49 +463,57 @@ def react_to_authors(api: tweepy.API):
     """
     reacted = False
     period = '15y'
-    tweets = get_tweets_from_list(api)
-
-    for tweet in tweets:
-        # Fails if already favorited
-        try:
-            tweet.favorite()
-        except:
-            continue
+    with operation('react', period=period), priority(LOW):
+        tweets = get_tweets_from_list(api)
+
+        # Screen every ticker of every candidate tweet at once
+        payers = lookup_dividend_payers([s['text'] for tweet in tweets for s in tweet.entities['symbols']])
+
+        for tweet in tweets:
+            # Get list of tickers in tweet that have distributed dividends in the past year
+            tickers = [s['text'] for s in tweet.entities['symbols'] if s['text'].upper() in payers]
+            if not tickers:
+                continue
+
+            # Fails if already favorited
+            try:
+                tweet.favorite()
+            except Deferred:
+                raise
+            except:
+                mark_favorited(REACTION_LIST_ID, tweet.id)
+                continue
+            # Stored tweets keep the flag from when they were downloaded
+            mark_favorited(REACTION_LIST_ID, tweet.id)
         
-        # Get list of tickers in tweet
-        tickers = [s['text'] for s in tweet.entities['symbols']]
-        random.shuffle(tickers)
-        print('Tickers for tweet:')
-        print(tweet.text)
-        print(f'{tickers}')
-        # Iterate over randomly over tickers
-        while len(tickers):
-            # Fetch historical data
-            ticker = random.choice(tickers)
-            print(f'Getting data for {ticker}')
-            past_year = yf.Ticker(ticker).history('1y', interval='3mo', auto_adjust=False)
-            
-            # If ticker has distributed dividends in the past year, exit loop and generate chart
-            if len(past_year[past_year.Dividends > 0]) > 0:
+            random.shuffle(tickers)
+            print('Tickers for tweet:')
+            print(tweet.text)
+            print(f'{tickers}')
+            # Iterate over randomly over tickers
+            for ticker in tickers:
                 try:
                     print(f'Attempting to make chart for ticker: {ticker}')
                     dividend_chart_reply_author(api, tweet, ticker, period)
                     print('Succeded!')
+                    annotate(ticker=ticker, tweet_id=tweet.id)
                     reacted = True
                     break
+                except Deferred:
+                    raise
                 except:
-                    pass
-            # Else remove it from the ticker list
-            tickers.remove(ticker)
+                    count('retries')
 
-        # If a ticker distributing dividends has been found
-        if reacted:
-            break
+            # If a ticker distributing dividends has been found
+            if reacted:
+                break
+        if not reacted:
+            annotate(outcome='no_reaction')
 
 def publish_ranking(api: tweepy.API):
     """
     Generate and publish a ranking of most active users of the @DividendChart bot.
-    Counts mentions from the past 4 weeks
+    Counts mentions from the past 4 weeks, from the incrementally updated mention log.
     
     Parameters:
     ----------
@@ -331,73 +524,130 @@ def publish_ranking(api: tweepy.API):
     ------
     Requires update to API v2.
     """
-    # Get most recent 200 tweets
-    mentions_timeline = api.mentions_timeline(count=200)
-
-    # Init timeline dataframe
-    mentions = pd.json_normalize([t._json for t in mentions_timeline])
-    mentions['created_at'] = pd.to_datetime(mentions.created_at)
-
-    while mentions.created_at.min() > mentions.created_at.max() - pd.Timedelta('4W'):
-        # Get oldest tweet it in current mentions dataframe
-        oldest_tweet_id = mentions[mentions.created_at == mentions.created_at.min()].iloc[0].id
-        # Collect older tweets
-        mentions_timeline = api.mentions_timeline(count=200, max_id=oldest_tweet_id)
-
-        # Create temporary dataframe with older data
-        _mentions = pd.json_normalize([t._json for t in mentions_timeline])
-        _mentions['created_at'] = pd.to_datetime(_mentions.created_at)
-
-        # Merge dataframes:
-        mentions = pd.concat([mentions, _mentions])
-        mentions = mentions.drop_duplicates(subset=['id'])
-
-    # Keep past 4 weeks
-    mentions = mentions[mentions.created_at >= mentions.created_at.max() - pd.Timedelta('4W')]
-
-    mentions = mentions.loc[~mentions['user.screen_name'].isin(['DividendChart', 'hugo_le_moine_']), ['text', 'user.screen_name']]
-    mentions['text'] = mentions.text.str.split('@DividendChart').str[-1].str.split()
-    mentions = mentions[mentions.text.str.len() == 2]
-    mentions = mentions.assign(ticker=mentions.text.str[0].str.strip('$').str.split('.').str[0].str.upper())
-    mentions = mentions.drop(columns=['text'])
-
-    ranking = mentions['user.screen_name'].value_counts().to_frame().reset_index()
-    ranking.columns = ['user', 'count']
-    ranking['rank'] = ranking['count'].rank(ascending=False, method='dense')
-    # ranking['cum_len'] = ranking['user'].str.len().add(1).cumsum()
-    ranking = ranking.iloc[:10]
-    # ranking = ranking[ranking.cum_len <= (200)]
-
-    tweet_most_active_users = [
-        'Most active users in the past month:',
-        '\n'.join('@' + ranking.user),
-        'Thank you all! :)'
-    ]
+    with operation('ranking'), priority(LOW):
+        counters = update_mention_log(api)
+        ranking = top_counts(counters, 'users', 10)
+
+        tweet_most_active_users = [
+            'Most active users in the past month:',
+            '\n'.join('@' + user for user, _ in ranking),
+            'Thank you all! :)'
+        ]
+
+        TWEET_LIMITER.wait()
+        with stage('post'):
+            api.update_status(status='\n'.join(tweet_most_active_users))
+
+def publish_ticker_ranking(api: tweepy.API):
+    """
+    Generate and publish a ranking of most requested tickers in the past 4 weeks.
+    
+    Parameters:
+    ----------
+    api: tweepy.API
+        API object to publish tweets
+   
+    Note:
+    ------
+    Requires update to API v2.
+    """
+    with operation('ticker_ranking'), priority(LOW):
+        counters = update_mention_log(api)
+        ranking = top_counts(counters, 'tickers', 10)
+
+        tweet_most_requested_tickers = [
+            'Most requested tickers in the past month:',
+            '\n'.join(f'${ticker} ({n})' for ticker, n in ranking),
+        ]
+
+        TWEET_LIMITER.wait()
+        with stage('post'):
+            api.update_status(status='\n'.join(tweet_most_requested_tickers))
+
+def run_daemon(api_v1: tweepy.API, api_v2: tweepy.Client, period: str):
+    """
+    Keep the bot running and run every task on its own timer.
+    API clients, HTTP sessions, the chart renderer and in-memory caches stay warm between tasks.
+    Mentions are polled on the main thread, other tasks run on a background thread so that
+    cache refreshes and rate limit waits never delay replies.
+
+    Parameters:
+    ----------
+    api_v1: tweepy.API
+        API object to publish tweets and upload media
+    api_v2: tweepy.Client
+        API client to publish tweets
+    period: str
+        Time period for random charts
+    """
+    warm_renderer()
 
-    api.update_status(status='\n'.join(tweet_most_active_users))
+    def refresh_caches():
+        prefetch_ticker_universe(period)
+        warm_chart_cache(['15y', '20y'])
 
+    run_forever({
+        'reply_to_tweets': (lambda: reply_to_tweets(api_v1), every(datetime.timedelta(seconds=MENTION_POLL_INTERVAL))),
+        'random_dividend_chart': (lambda: random_dividend_chart(api_v1, api_v2, period), every(datetime.timedelta(hours=2), hours=range(6, 23))),
+        'react_to_authors': (lambda: react_to_authors(api_v1), every(datetime.timedelta(hours=1), hours=range(9, 22))),
+        'publish_ranking': (lambda: publish_ranking(api_v1), weekly(weekday=6, hour=18)),
+        'publish_ticker_ranking': (lambda: publish_ticker_ranking(api_v1), weekly(weekday=6, hour=19)),
+        'refresh_caches': (refresh_caches, daily(hour=3)),
+    }, background={'random_dividend_chart', 'react_to_authors', 'publish_ranking', 'publish_ticker_ranking', 'refresh_caches'})
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'mode',
+        nargs='?',
+        default='random',
+        choices=['random', 'prefetch', 'warm', 'ticker-ranking', 'daemon'],
+        help='random: post a chart for a random ticker, prefetch: download histories of the ticker universe, warm: render charts of the ticker universe, ticker-ranking: post the most requested tickers, daemon: keep running and schedule all tasks'
+    )
+    parser.add_argument('--period', default='20y')
+    args = parser.parse_args()
+
+    if args.mode == 'prefetch':
+        prefetch_ticker_universe(args.period)
+        raise SystemExit
+
+    if args.mode == 'warm':
+        warm_chart_cache(['15y', '20y'])
+        raise SystemExit
+
     auth = tweepy.OAuth1UserHandler(
         consumer_key=os.environ['api_key'],
         consumer_secret=os.environ['api_secret'],
         access_token=os.environ['access_token'],
         access_token_secret=os.environ['access_token_secret']
     )
-    api_v1 = tweepy.API(auth, wait_on_rate_limit=True)
+    # Rate limits defer work instead of blocking the process, replies keep a share of every quota
+    api_v1 = BudgetedAPI(auth, TWITTER_BUDGET)
 
-    api_v2 = tweepy.Client(
+    api_v2 = BudgetedClient(
+        TWITTER_BUDGET,
         consumer_key=os.environ['api_key'],
         consumer_secret=os.environ['api_secret'],
         access_token=os.environ['access_token'],
         access_token_secret=os.environ['access_token_secret']
     )
 
+    if args.mode == 'daemon':
+        run_daemon(api_v1, api_v2, args.period)
+
+    if args.mode == 'ticker-ranking':
+        publish_ticker_ranking(api_v1)
+        raise SystemExit
+
     # reply_to_tweets(api)
     
     # Post dividend chart for a random dividend achiever every 2 hours
     # if (datetime.datetime.now().hour in range(6, 23, 1)):
-    random_dividend_chart(api_v1, api_v2, '20y')
+    try:
+        random_dividend_chart(api_v1, api_v2, args.period)
+    except Deferred as e:
+        # Skipped, the next scheduled execution posts instead
+        print(e)
 
     # if (datetime.datetime.now().minute < 30) and (datetime.datetime.now().hour in range(9, 22)):
         # react_to_authors(api)
@@ -0,0 +1,104 @@
+import datetime
+import threading
+from collections import Counter
+import tweepy
+from storage import cache_path, read_json, write_json
+from tweet_store import fetch_newer, created_at
+
+# Mentions counted in rankings
+RANKING_WINDOW = datetime.timedelta(weeks=4)
+# Accounts not counted in rankings
+EXCLUDED_USERS = {'DividendChart', 'hugo_le_moine_'}
+
+_log_lock = threading.Lock()
+
+def parse_mention(tweet: dict) -> dict:
+    """
+    Extract user, ticker and period of a chart request.
+
+    Parameters:
+    ----------
+    tweet: dict
+        Mention as json
+
+    Returns:
+    -------
+    dict with id, created_at, user, ticker and period (None if not a valid request).
+    """
+    params = tweet.get('full_text', tweet.get('text', '')).split('@DividendChart')[-1].split()
+    ticker, period = params if len(params) == 2 else (None, None)
+    if ticker:
+        ticker = ticker.strip('$').split('.')[0].upper()
+    return {
+        'id': tweet['id'],
+        'created_at': created_at(tweet).isoformat(),
+        'user': tweet['user']['screen_name'],
+        'ticker': ticker,
+        'period': period,
+    }
+
+def update_mention_log(api: tweepy.API) -> dict:
+    """
+    Count new mentions in per day counters of users and tickers, the counters are the only state kept.
+    Only mentions newer than the last counted one are downloaded.
+
+    Parameters:
+    ----------
+    api: tweepy.API
+        API object to read mentions
+
+    Returns:
+    -------
+    counters: {'since_id': int, 'days': {date: {'users': {user: count}, 'tickers': {ticker: count}}}}
+    """
+    with _log_lock:
+        counters_path = cache_path('mention_counters.json')
+        counters = read_json(counters_path, default={'since_id': None, 'days': {}})
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        tweets = fetch_newer(
+            lambda **kwargs: api.mentions_timeline(count=200, tweet_mode='extended', **kwargs),
+            since_id=counters['since_id'],
+            oldest=now - RANKING_WINDOW,
+            max_tweets=float('inf'),
+        )
+        mentions = sorted((parse_mention(t) for t in tweets), key=lambda m: m['id'])
+
+        days = counters['days']
+        for mention in mentions:
+            if mention['ticker'] is None or mention['user'] in EXCLUDED_USERS:
+                continue
+            day = days.setdefault(mention['created_at'][:10], {'users': {}, 'tickers': {}})
+            day['users'][mention['user']] = day['users'].get(mention['user'], 0) + 1
+            day['tickers'][mention['ticker']] = day['tickers'].get(mention['ticker'], 0) + 1
+
+        # Slide the window
+        first_day = (now - RANKING_WINDOW).date().isoformat()
+        counters = {
+            'since_id': mentions[-1]['id'] if mentions else counters['since_id'],
+            'days': {day: values for day, values in days.items() if day >= first_day},
+        }
+        write_json(counters_path, counters)
+    return counters
+
+def top_counts(counters: dict, key: str, n: int=10) -> list[tuple[str, int]]:
+    """
+    Returns the n most frequent users or tickers of the ranking window.
+
+    Parameters:
+    ----------
+    counters: dict
+        Output of update_mention_log
+    key: str
+        users or tickers
+    n: int
+        Number of entries
+
+    Returns:
+    -------
+    list of (name, count), most frequent first.
+    """
+    total = Counter()
+    for day in counters['days'].values():
+        total.update(day[key])
+    return total.most_common(n)
@@ -0,0 +1,126 @@
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from scheduler import Deferred
+
+# JSON lines are appended to this file, or printed to stdout (picked up by Cloud Logging) when unset
+METRICS_FILE = os.environ.get('METRICS_FILE')
+
+_current = contextvars.ContextVar('metrics_operation', default=None)
+_write_lock = threading.Lock()
+
+# Counters of the whole process, across operations
+totals = Counter()
+_totals_lock = threading.Lock()
+
+class Operation:
+    """
+    Measurements of one entry point run (a reply, a random post, ...): stage durations, counters and fields.
+    """
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = dict(fields)
+        self.stages = Counter()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, outcome: str, duration: float, error: Exception=None) -> dict:
+        with self.lock:
+            record = {
+                'event': self.name,
+                **self.fields,
+                'outcome': outcome,
+                'duration': round(duration, 4),
+                'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+                'counters': dict(self.counters),
+            }
+        if error is not None:
+            record['error'] = f'{type(error).__name__}: {error}'
+        return record
+
+def emit(record: dict):
+    """
+    Write a structured record as one JSON line.
+    """
+    line = json.dumps({'time': time.time(), **record}, default=str)
+    with _write_lock:
+        if METRICS_FILE:
+            with open(METRICS_FILE, 'a') as f:
+                f.write(line + '\n')
+        else:
+            print(line, file=sys.stdout, flush=True)
+
+@contextlib.contextmanager
+def operation(name: str, **fields):
+    """
+    Measure an entry point. Stages and counters recorded inside are attached to it,
+    and a JSON line with its outcome is emitted when it ends. Exceptions are recorded and re-raised.
+
+    Parameters:
+    ----------
+    - name: str
+        Name of the entry point (reply, random_post, react, ranking, ...)
+    - fields:
+        Extra fields of the record, such as ticker and period
+    """
+    op = Operation(name, fields)
+    token = _current.set(op)
+    start = time.perf_counter()
+    try:
+        yield op
+    except Deferred as e:
+        emit(op.record('deferred', time.perf_counter() - start, e))
+        raise
+    except BaseException as e:
+        emit(op.record('error', time.perf_counter() - start, e))
+        raise
+    else:
+        emit(op.record(op.fields.pop('outcome', 'ok'), time.perf_counter() - start))
+    finally:
+        _current.reset(token)
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Add the duration of a block to a stage of the current operation.
+    Stages entered several times are summed. Does nothing outside of an operation.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        op = _current.get()
+        if op is not None:
+            with op.lock:
+                op.stages[name] += time.perf_counter() - start
+
+def count(name: str, n: int=1):
+    """
+    Increment a counter (cache hits, retries, ...) of the current operation and of the process.
+    """
+    with _totals_lock:
+        totals[name] += n
+    op = _current.get()
+    if op is not None:
+        with op.lock:
+            op.counters[name] += n
+
+def annotate(**fields):
+    """
+    Set fields of the current operation record, such as ticker, period or outcome.
+    """
+    op = _current.get()
+    if op is not None:
+        with op.lock:
+            op.fields.update(fields)
+
+def submit(executor, func, *args, **kwargs):
+    """
+    Submit a function to an executor, attaching its stages and counters to the current operation.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
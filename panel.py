@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from history_cache import load_history
+from utils import ANNUAL_DIVIDEND_COUNT
+
+DECILES = np.arange(0, 1.1, .1)
+
+def load_panel(tickers: list[str], period: str) -> pd.DataFrame:
+    """
+    Build a long-format panel from the local history store.
+
+    Parameters:
+    ----------
+    - tickers: list[str]
+        Tickers from yahoo finance
+    - period: str
+        Period to collect data from (ytd, 1wk, 1m, 6m, 1y, 10y, ..., max)
+
+    Returns:
+    -------
+    - pd.DataFrame with ticker, date, close, dividend columns
+    """
+    frames = []
+    for ticker in tickers:
+        history = load_history(ticker, period)
+        if history.empty:
+            continue
+        frames.append(pd.DataFrame({
+            'ticker': ticker,
+            'date': history.index,
+            'close': history.Close.to_numpy(),
+            'dividend': history.Dividends.to_numpy(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def _group_starts(codes: np.ndarray) -> np.ndarray:
+    starts = np.empty(len(codes), dtype=bool)
+    starts[:1] = True
+    starts[1:] = codes[1:] != codes[:-1]
+    return starts
+
+def panel_dividend_history(panel: pd.DataFrame) -> pd.DataFrame:
+    """
+    Grouped equivalent of utils.process_dividend_history for many tickers at once.
+    Tickers with less than two years of distributions are left out.
+
+    Parameters:
+    ----------
+    - panel: pd.DataFrame
+        Long-format panel with ticker, date, close, dividend columns
+
+    Returns:
+    -------
+    - pd.DataFrame with ticker, date, dividend, annual_dividend_count, smoothed_dividends, yearly_dividends, div_growth
+    """
+    events = panel.loc[panel.dividend > 0, ['ticker', 'date', 'dividend']].sort_values(['ticker', 'date'])
+    codes, tickers = pd.factorize(events.ticker)
+    dates = events.date.to_numpy()
+    amounts = events.dividend.to_numpy(dtype=float)
+
+    # Keep one distribution per month and ticker
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    keep = _group_starts(codes) | (months != np.roll(months, 1))
+    codes, dates, amounts = codes[keep], dates[keep], amounts[keep]
+
+    # Count distributions per ticker and year
+    years = dates.astype('datetime64[Y]').astype(np.int64)
+    ticker_starts = _group_starts(codes)
+    year_starts = ticker_starts | (years != np.roll(years, 1))
+    year_group = np.cumsum(year_starts) - 1
+    yearly_distributions = np.bincount(year_group)
+
+    # Tickers need at least two years of distributions
+    group_ticker = codes[year_starts]
+    years_per_ticker = np.bincount(group_ticker)
+    valid = years_per_ticker[codes] >= 2
+
+    # First and current year do not have all distributions, use next and previous year's numbers
+    group_starts = _group_starts(group_ticker)
+    group_ends = np.roll(group_starts, -1)
+    group_valid = years_per_ticker[group_ticker] >= 2
+    first_groups = np.flatnonzero(group_starts & group_valid)
+    last_groups = np.flatnonzero(group_ends & group_valid)
+    yearly_distributions[first_groups] = yearly_distributions[first_groups + 1]
+    yearly_distributions[last_groups] = yearly_distributions[last_groups - 1]
+    annual_count = ANNUAL_DIVIDEND_COUNT[yearly_distributions[year_group]]
+
+    # Centered rolling median over 5 distributions of the same ticker, raw amounts on the edges
+    smoothed = amounts.copy()
+    if len(amounts) >= 5:
+        windows = np.lib.stride_tricks.sliding_window_view(amounts, 5)
+        same_ticker = codes[:-4] == codes[4:]
+        smoothed[2:-2] = np.where(same_ticker, np.median(windows, axis=1), amounts[2:-2])
+
+    yearly_sums = np.bincount(year_group, weights=amounts)
+    yearly = np.where(
+        annual_count <= 3,
+        yearly_sums[year_group],
+        smoothed * annual_count
+    )
+
+    # Get at least one full year per ticker
+    first_dates = dates[np.flatnonzero(ticker_starts)][np.cumsum(ticker_starts) - 1]
+    keep = valid & (dates > first_dates + np.timedelta64(365, 'D'))
+
+    dividends = pd.DataFrame({
+        'ticker': tickers[codes[keep]],
+        'date': dates[keep],
+        'dividend': amounts[keep],
+        'annual_dividend_count': annual_count[keep],
+        'smoothed_dividends': smoothed[keep],
+        'yearly_dividends': yearly[keep],
+    })
+    # Growth in dividends since beginning of timeframe
+    dividends['div_growth'] = dividends.yearly_dividends / dividends.groupby('ticker', sort=False).yearly_dividends.transform('first') - 1
+    return dividends
+
+def panel_metrics(panel: pd.DataFrame) -> pd.DataFrame:
+    """
+    Daily dividend metrics for many tickers, in a single grouped pass.
+    Mirrors the computations of utils.generate_dividend_chart.
+
+    Parameters:
+    ----------
+    - panel: pd.DataFrame
+        Long-format panel with ticker, date, close, dividend columns
+
+    Returns:
+    -------
+    - pd.DataFrame with ticker, date, close, yearly_dividends, drawdown, dividend_yield,
+    starting from the first dividend of each ticker
+    """
+    panel = panel.sort_values(['ticker', 'date'], ignore_index=True)
+    dividends = panel_dividend_history(panel)
+
+    # Merge dividends with price history
+    df = pd.merge(
+        left=panel[['ticker', 'date', 'close']],
+        right=dividends[['ticker', 'date', 'yearly_dividends']],
+        on=['ticker', 'date'],
+        how='left'
+    )
+    df['yearly_dividends'] = df.groupby('ticker', sort=False).yearly_dividends.ffill(limit=300).fillna(0)
+    df['drawdown'] = df.close / df.groupby('ticker', sort=False).close.cummax() - 1
+
+    # Keep data from first dividend
+    started = (df.yearly_dividends > 0).astype(int).groupby(df.ticker, sort=False).cummax() > 0
+    df = df[started].reset_index(drop=True)
+
+    # Calculate dividend yield base on TTM distributions
+    df['dividend_yield'] = df.yearly_dividends / df.close
+    return df
+
+def panel_summary(panel: pd.DataFrame) -> pd.DataFrame:
+    """
+    Current dividend metrics and yield distribution of many tickers.
+
+    Parameters:
+    ----------
+    - panel: pd.DataFrame
+        Long-format panel with ticker, date, close, dividend columns
+
+    Returns:
+    -------
+    - pd.DataFrame with one row per ticker: date, close, yearly_dividends, dividend_yield, drawdown,
+    max_drawdown, yield_percentile (share of the period with a lower or equal yield) and yield deciles yield_d0 to yield_d10
+    """
+    df = panel_metrics(panel)
+    grouped = df.groupby('ticker', sort=False)
+
+    summary = grouped[['date', 'close', 'yearly_dividends', 'dividend_yield', 'drawdown']].last()
+    summary['max_drawdown'] = grouped.drawdown.min()
+
+    # Percentile rank of the current yield, same as rank(pct=True) on a single ticker
+    current_yield = grouped.dividend_yield.transform('last')
+    below = (df.dividend_yield < current_yield).groupby(df.ticker, sort=False).sum()
+    equal = (df.dividend_yield == current_yield).groupby(df.ticker, sort=False).sum()
+    summary['yield_percentile'] = (below + (equal + 1) / 2) / grouped.dividend_yield.count()
+
+    deciles = grouped.dividend_yield.quantile(DECILES).unstack()
+    deciles.columns = [f'yield_d{i}' for i in range(len(DECILES))]
+    summary = summary.join(deciles)
+
+    return summary.reset_index()
@@ -0,0 +1,43 @@
+import altair as alt
+from metrics import stage
+
+# Vega-Lite version matching the installed Altair, in vl-convert format (e.g. v5_15)
+VL_VERSION = '_'.join(alt.SCHEMA_VERSION.split('.')[:2])
+
+def chart_to_png(chart: alt.TopLevelMixin, scale: float=1) -> bytes:
+    """
+    Render a chart to PNG bytes with the in-process vl-convert engine.
+    The converter is started once per process and reused by every call, no file is written.
+
+    Parameters:
+    ----------
+    - chart: alt.TopLevelMixin
+        Chart to render
+    - scale: float
+        Image scale factor
+
+    Returns:
+    -------
+    - bytes of the PNG image
+    """
+    import vl_convert as vlc
+
+    with stage('spec'):
+        spec = chart.to_dict()
+    with stage('render'):
+        return vlc.vegalite_to_png(
+            spec,
+            vl_version=VL_VERSION,
+            scale=scale,
+        )
+
+def warm_renderer():
+    """
+    Start the vl-convert engine ahead of the first chart.
+    """
+    import vl_convert as vlc
+
+    vlc.vegalite_to_png(
+        alt.Chart(alt.Data(values=[{'x': 0}])).mark_point().encode(x='x:Q').to_dict(),
+        vl_version=VL_VERSION,
+    )
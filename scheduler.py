@@ -0,0 +1,102 @@
+import datetime
+import queue
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+class Deferred(Exception):
+    """
+    Raised by a task that cannot do its work now, to run it again at a given time instead of its next scheduled run.
+    """
+    def __init__(self, until: datetime.datetime, reason: str=''):
+        super().__init__(reason or f'Deferred until {until:%H:%M:%S}')
+        self.until = until
+
+def every(interval: datetime.timedelta, hours: range=range(24)) -> Callable[[datetime.datetime], datetime.datetime]:
+    """
+    Schedule running every interval, only during some hours of the day.
+    """
+    def next_run(now: datetime.datetime) -> datetime.datetime:
+        run = now + interval
+        while run.hour not in hours:
+            run = (run + datetime.timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+        return run
+    return next_run
+
+def daily(hour: int) -> Callable[[datetime.datetime], datetime.datetime]:
+    """
+    Schedule running every day at a given hour.
+    """
+    def next_run(now: datetime.datetime) -> datetime.datetime:
+        run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        return run if run > now else run + datetime.timedelta(days=1)
+    return next_run
+
+def weekly(weekday: int, hour: int) -> Callable[[datetime.datetime], datetime.datetime]:
+    """
+    Schedule running every week on a weekday (0 is monday) at a given hour.
+    """
+    def next_run(now: datetime.datetime) -> datetime.datetime:
+        run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        run += datetime.timedelta(days=(weekday - now.weekday()) % 7)
+        return run if run > now else run + datetime.timedelta(weeks=1)
+    return next_run
+
+def _run_task(name: str, func: Callable, schedule: Callable) -> datetime.datetime:
+    """
+    Run a task once and returns its next run time.
+    """
+    print(f'Running {name}')
+    try:
+        func()
+    except Deferred as e:
+        print(f'{name}: {e}')
+        return e.until
+    except Exception:
+        traceback.print_exc()
+    return schedule(datetime.datetime.now())
+
+def run_forever(tasks: dict[str, tuple[Callable, Callable]], background: set[str]=frozenset()):
+    """
+    Run tasks on their schedule until the process is stopped.
+    A failing task is logged and scheduled again, a deferred task runs again when it asked to.
+    Background tasks run one at a time on a worker thread, so that long jobs or rate limit waits
+    do not delay the other tasks. A background task is not started again while it is running.
+
+    Parameters:
+    ----------
+    tasks: dict
+        Task name -> (function without arguments, schedule function returning the next run time)
+    background: set
+        Names of the tasks to run on the worker thread
+    """
+    now = datetime.datetime.now()
+    next_runs = {name: schedule(now) for name, (_, schedule) in tasks.items()}
+    # Background tasks report their next run time here when they end
+    finished = queue.Queue()
+    running = set()
+    worker = ThreadPoolExecutor(1, thread_name_prefix='background')
+
+    def run_in_background(name: str, func: Callable, schedule: Callable):
+        finished.put((name, _run_task(name, func, schedule)))
+
+    while True:
+        waiting = {name: run for name, run in next_runs.items() if name not in running}
+        delay = (min(waiting.values()) - datetime.datetime.now()).total_seconds() if waiting else None
+        if delay is None or delay > 0:
+            # Sleep until the next run, waking up early when a background task ends
+            try:
+                name, next_run = finished.get(timeout=delay)
+                running.discard(name)
+                next_runs[name] = next_run
+            except queue.Empty:
+                pass
+            continue
+
+        name = min(waiting, key=waiting.get)
+        func, schedule = tasks[name]
+        if name in background:
+            running.add(name)
+            worker.submit(run_in_background, name, func, schedule)
+        else:
+            next_runs[name] = _run_task(name, func, schedule)
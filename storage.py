@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+
+# Root folder for everything the bot persists between runs (caches, cursors, logs).
+# Point it to a mounted volume to keep data across Cloud Run executions.
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join('data', 'cache'))
+
+def cache_path(*parts: str) -> str:
+    """
+    Returns a path inside the cache folder, creating parent folders if needed.
+
+    Parameters:
+    ----------
+    - parts: str
+        Path components relative to CACHE_DIR
+
+    Returns:
+    -------
+    - str path
+    """
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def safe_filename(key: str) -> str:
+    """
+    Turns a ticker or any cache key into a string usable as a file name.
+    """
+    return ''.join(c if c.isalnum() or c in '-_.^=' else '_' for c in key)
+
+def atomic_write_bytes(path: str, data: bytes):
+    """
+    Write data to path so that concurrent readers never see a partial file.
+
+    Parameters:
+    ----------
+    - path: str
+        Destination file
+    - data: bytes
+        Content to write
+    """
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def read_json(path: str, default=None):
+    """
+    Read a json file, returning default if it is missing or corrupted.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def write_json(path: str, data):
+    """
+    Atomically write data as json.
+    """
+    atomic_write_bytes(path, json.dumps(data, default=str).encode())
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Modules of the bot live at the repository root, caches go to a throwaway folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Tests share the synthetic histories of the benchmarks
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='dividend-chart-bot-'))
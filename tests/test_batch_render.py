@@ -0,0 +1,38 @@
+import os
+import signal
+import time
+import batch_render
+from batch_render import RenderResult, render_batch
+
+def init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, batch_render._on_alarm)
+
+def fake_job(ticker: str, period: str, currency_symbol: str, timeout: float) -> RenderResult:
+    """
+    Stands for _render_job in workers: crashes the worker, hangs out of reach of the alarm, or renders instantly.
+    """
+    if ticker == 'CRASH':
+        os._exit(1)
+    if ticker == 'HANG':
+        signal.signal(signal.SIGALRM, signal.SIG_IGN)
+        time.sleep(60)
+    return RenderResult(ticker, period, currency_symbol, png=b'png')
+
+def test_failed_jobs_do_not_stall_the_batch(monkeypatch):
+    monkeypatch.setattr(batch_render, '_init_worker', init_worker)
+    monkeypatch.setattr(batch_render, '_render_job', fake_job)
+    monkeypatch.setattr(batch_render, 'RENDER_WORKER_START_TIMEOUT', 5)
+    jobs = [(ticker, '15y', '$') for ticker in ['KO', 'CRASH', 'PEP', 'HANG', 'JNJ', 'O']]
+
+    start = time.monotonic()
+    results = render_batch(jobs, processes=2, timeout=1)
+    # Far from the 60s a hanging job would take, or a batch deadline for every job
+    assert time.monotonic() - start < 30
+
+    assert [(r.ticker, r.period, r.currency_symbol) for r in results] == jobs
+    errors = {r.ticker: r.error for r in results}
+    assert errors.pop('CRASH') == 'Render worker crashed'
+    assert errors.pop('HANG') == 'Render job did not finish in time'
+    assert all(error is None for error in errors.values())
+    assert all(r.png == b'png' for r in results if r.error is None)
@@ -0,0 +1,74 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from utils import process_dividend_history
+from synthetic import synthetic_history
+
+def baseline_process_dividend_history(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Frozen copy of the pandas implementation replaced by dividend_history_arrays.
+    """
+    # Get df with dividend distributions
+    dividends = history.loc[history.Dividends > 0, 'Dividends'].to_frame()
+
+    # Keep one distribution per month
+    dividends['Month'] = dividends.index.to_period('1M')
+    dividends = (dividends
+        .reset_index()
+        .groupby('Month', as_index=False)
+        .first()
+        .set_index('Date')
+        .drop(columns=['Month'])
+    )
+
+    # Count distributions per year
+    yearly_distributions = dividends.groupby(dividends.index.year).Dividends.count()
+    # First and current year do not have all distributions, use next and previous year's numbers
+    yearly_distributions.iloc[0] = yearly_distributions.iloc[1]
+    yearly_distributions.iloc[-1] = yearly_distributions.iloc[-2]
+    # Map values
+    dividends['AnnualDividendCount'] = dividends.index.year.map(yearly_distributions)
+    dividends['AnnualDividendCount'] = pd.cut(
+        dividends.AnnualDividendCount,
+        bins=[-np.inf, 0, 1, 2, 3, 4, 8, 12],
+        labels=[0, 1, 2, 4, 4, 4, 12],
+        ordered=False,
+    ).astype(int)
+
+    dividends['SmoothedDividends'] = (dividends
+        .Dividends
+        .rolling(5, center=True)
+        .median()
+    )
+    dividends['SmoothedDividends'] = dividends.SmoothedDividends.combine_first(dividends.Dividends)
+
+    dividends['YearlyDividends']= np.where(
+        dividends.AnnualDividendCount <= 3,
+        dividends.index.year.map(dividends.groupby(dividends.index.year).Dividends.sum()),
+        dividends.SmoothedDividends * dividends.AnnualDividendCount
+    )
+
+    # Get at least one full year
+    dividends = dividends.loc[dividends.index > dividends.index[0] + datetime.timedelta(days=365)]
+
+    # Growth in dividends since beginning of timeframe
+    dividends['DivGrowth'] = dividends['YearlyDividends'] / dividends['YearlyDividends'].iloc[0] - 1
+    dividends = dividends.reset_index()
+
+    return dividends
+
+@pytest.mark.parametrize('tz', [None, 'America/New_York'])
+@pytest.mark.parametrize('payout', ['monthly', 'quarterly', 'irregular'])
+def test_matches_baseline(payout, tz):
+    history = synthetic_history(8, payout, tz=tz)
+    expected = baseline_process_dividend_history(history)
+    result = process_dividend_history(history)
+
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_series_equal(result.Date, expected.Date, check_dtype=False)
+    pd.testing.assert_frame_equal(
+        result.drop(columns=['Date']),
+        expected.drop(columns=['Date']),
+        check_dtype=False,
+    )
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+import yfinance
+import storage
+from dividend_index import load_index, lookup_dividend_payers
+from synthetic import synthetic_history
+
+@pytest.fixture(autouse=True)
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'CACHE_DIR', str(tmp_path))
+
+def bulk_download(histories: dict[str, pd.DataFrame]):
+    """
+    Stands for yf.download with group_by='ticker': symbols missing from histories failed and only have empty bars.
+    """
+    def download(tickers, **kwargs):
+        index = next(iter(histories.values())).index
+        empty = pd.DataFrame(np.nan, index=index, columns=['Close', 'Dividends'])
+        return pd.concat({ticker: histories.get(ticker, empty) for ticker in tickers}, axis=1)
+    return download
+
+def test_failed_downloads_are_not_cached(monkeypatch):
+    today = pd.Timestamp.now().normalize()
+    payer = synthetic_history(2, 'monthly', end=today)[['Close', 'Dividends']]
+    monkeypatch.setattr(yfinance, 'download', bulk_download({
+        'KO': payer,
+        'GOOG': payer.assign(Dividends=0.0),
+    }))
+
+    assert lookup_dividend_payers(['KO', 'GOOG', 'PEP']) == {'KO'}
+    index = load_index()
+    assert {symbol: entry['payer'] for symbol, entry in index.items()} == {'KO': True, 'GOOG': False}
+
+    # PEP is checked again on the next lookup
+    monkeypatch.setattr(yfinance, 'download', bulk_download({'PEP': payer}))
+    assert lookup_dividend_payers(['KO', 'GOOG', 'PEP']) == {'KO', 'PEP'}
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from downsample import downsample_chart_data
+from history_cache import normalize_history
+from utils import _compute_chart_data
+from synthetic import synthetic_history
+
+SERIES = ['Close', 'DividendYield', 'Drawdown']
+
+@pytest.fixture(scope='module')
+def chart_data() -> pd.DataFrame:
+    data = _compute_chart_data('TEST', '20y', normalize_history(synthetic_history(20, 'quarterly')))
+    return pd.concat([data.history, data.bands.drop(columns=['Date'])], axis=1)
+
+@pytest.mark.parametrize('method', ['lttb', 'weekly'])
+def test_last_bar_and_extremes_are_kept(chart_data, method):
+    reduced = downsample_chart_data(chart_data, series=SERIES, keep_extremes=SERIES, max_points=1200, method=method)
+    assert len(reduced) < len(chart_data)
+
+    pd.testing.assert_series_equal(reduced.iloc[-1], chart_data.iloc[-1], check_names=False)
+    pd.testing.assert_series_equal(reduced.iloc[0], chart_data.iloc[0], check_names=False)
+    for column in SERIES:
+        for extreme in ['idxmin', 'idxmax']:
+            row = chart_data.loc[getattr(chart_data[column], extreme)()]
+            assert (reduced.Date == row.Date).any()
+            assert reduced[column].agg(extreme[3:]) == row[column]
+
+def test_lttb_keeps_about_max_points(chart_data):
+    reduced = downsample_chart_data(chart_data, series=SERIES, keep_extremes=SERIES, max_points=1200, method='lttb')
+    assert 900 <= len(reduced) <= 1300
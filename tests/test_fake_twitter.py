@@ -0,0 +1,93 @@
+import datetime
+import pandas as pd
+import pytest
+import tweepy
+import fake_twitter
+import history_cache
+import main
+import storage
+from scheduler import Deferred
+from tweet_store import collect_list_timeline
+from twitter_client import RateBudget, BudgetedAPI
+from synthetic import synthetic_history
+
+TICKERS = ['KO', 'PEP', 'JNJ', 'O', 'MMM']
+
+def store_history(ticker: str, seed: int):
+    """
+    Put a 16 years history in the store, up to today, so that no download is needed.
+    """
+    history = synthetic_history(16, 'quarterly', seed=seed, end=pd.Timestamp.now().normalize())
+    history_cache.write_entry(ticker, history_cache.normalize_history(history), covered_from=None, fetched_at=pd.Timestamp.now())
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    # Each test starts without reply cursor nor stored timelines
+    monkeypatch.setattr(storage, 'CACHE_DIR', str(tmp_path))
+    for seed, ticker in enumerate(TICKERS):
+        store_history(ticker, seed)
+
+    def no_info(ticker):
+        raise ValueError('No ticker info in tests')
+    monkeypatch.setattr(main, 'get_ticker_info', no_info)
+
+    server = fake_twitter.serve(0, mentions=6, list_tweets=450)
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def api(server) -> BudgetedAPI:
+    auth = tweepy.OAuth1UserHandler('key', 'secret', 'token', 'token_secret')
+    return BudgetedAPI(auth, RateBudget(), base_url=f'http://localhost:{server.server_port}')
+
+def test_reply_to_tweets(server, api):
+    twitter = server.twitter
+    mention_ids = {mention['id'] for mention in twitter.mentions}
+
+    main.reply_to_tweets(api)
+    assert len(twitter.tweets) == 6
+    assert {int(tweet['in_reply_to_status_id']) for tweet in twitter.tweets} == mention_ids
+    assert twitter.favorites == mention_ids
+
+    # Favorited mentions are not answered twice
+    main.reply_to_tweets(api)
+    assert len(twitter.tweets) == 6
+    assert twitter.favorites == mention_ids
+
+def test_deferred_mention_is_answered_on_next_run(server, api, monkeypatch):
+    twitter = server.twitter
+    mention_ids = {mention['id'] for mention in twitter.mentions}
+    # An old mention defers while newer ones are answered and liked
+    deferred_id = sorted(mention_ids)[1]
+    reply = main.dividend_chart_reply_request
+
+    def reply_or_defer(api, tweet):
+        if tweet.id == deferred_id:
+            raise Deferred(datetime.datetime.now(), 'Quota used')
+        reply(api, tweet)
+    monkeypatch.setattr(main, 'dividend_chart_reply_request', reply_or_defer)
+
+    with pytest.raises(Deferred):
+        main.reply_to_tweets(api)
+    assert twitter.favorites == mention_ids - {deferred_id}
+    assert len(twitter.tweets) == 5
+
+    monkeypatch.setattr(main, 'dividend_chart_reply_request', reply)
+    main.reply_to_tweets(api)
+    assert twitter.favorites == mention_ids
+    assert sorted(int(tweet['in_reply_to_status_id']) for tweet in twitter.tweets) == sorted(mention_ids)
+
+    main.reply_to_tweets(api)
+    assert len(twitter.tweets) == 6
+
+def test_list_timeline_pages_and_keeps_a_cursor(server, api):
+    twitter = server.twitter
+    tweets = collect_list_timeline(api, main.REACTION_LIST_ID)
+    # 450 tweets take three pages of 200
+    assert sorted(t['id'] for t in tweets) == sorted(t['id'] for t in twitter.list_tweets)
+
+    new = [twitter.status(f'New tweet {i}') for i in range(3)]
+    twitter.list_tweets += new
+    tweets = collect_list_timeline(api, main.REACTION_LIST_ID)
+    assert len(tweets) == 453
+    assert {t['id'] for t in new} <= {t['id'] for t in tweets}
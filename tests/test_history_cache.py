@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+import storage
+from history_cache import normalize_history, load_history, period_start, read_entry, write_entry
+from utils import _compute_chart_data
+from synthetic import synthetic_history
+
+def test_normalize_history_drops_missing_prices():
+    raw = synthetic_history(16, 'quarterly', tz='America/New_York')
+    n = len(raw)
+    # Missing bars, including the first one and a duplicated date whose last copy has no price
+    raw.iloc[[0, 100, 2000], raw.columns.get_loc('Close')] = np.nan
+    raw = pd.concat([raw, raw.iloc[[500]].assign(Close=np.nan)])
+
+    history = normalize_history(raw)
+    assert history.Close.notna().all()
+    assert len(history) == n - 3
+    assert history.index.is_unique
+
+    data = _compute_chart_data('TEST', '15y', history)
+    assert not data.history.Drawdown.isna().any()
+    assert not data.bands.drop(columns=['Date']).isna().any().any()
+    assert np.isfinite(data.stats['median_yield'])
+
+class StubSource:
+    """
+    Stands for yahoo_history: serves a synthetic yfinance history up to today and records the calls.
+    """
+    def __init__(self, history: pd.DataFrame):
+        self.history = history
+        self.calls = []
+
+    def __call__(self, ticker: str, period: str=None, start=None) -> pd.DataFrame:
+        self.calls.append({'period': period, 'start': start})
+        if start is None:
+            start = period_start(period, pd.Timestamp.now())
+        if start is None:
+            return self.history
+        return self.history[self.history.index.tz_localize(None) >= pd.Timestamp(start)]
+
+@pytest.fixture
+def source(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'CACHE_DIR', str(tmp_path))
+    today = pd.Timestamp.now().normalize()
+    return StubSource(synthetic_history(16, 'quarterly', end=today, tz='America/New_York'))
+
+def expected(source: StubSource, period: str) -> pd.DataFrame:
+    history = normalize_history(source.history)
+    return history[history.index >= period_start(period, pd.Timestamp.now())]
+
+def test_cold_fetch_is_stored(source):
+    history = load_history('KO', '5y', source=source)
+    pd.testing.assert_frame_equal(history, expected(source, '5y'))
+    assert source.calls == [{'period': '5y', 'start': None}]
+
+    # Fresh store: no download
+    pd.testing.assert_frame_equal(load_history('KO', '5y', source=source), history)
+    assert len(source.calls) == 1
+
+def test_stale_store_appends_recent_bars(source):
+    full = normalize_history(source.history)
+    last_cached = full.index[-6]
+    write_entry('KO', full[full.index <= last_cached], covered_from=None, fetched_at=pd.Timestamp.now() - pd.Timedelta('2h'))
+
+    history = load_history('KO', '10y', source=source)
+    pd.testing.assert_frame_equal(history, expected(source, '10y'))
+    # Only bars from the last cached date are downloaded
+    assert source.calls == [{'period': None, 'start': last_cached.strftime('%Y-%m-%d')}]
+    assert read_entry('KO')['history'].index[-1] == full.index[-1]
+
+def test_split_after_last_cached_bar_refetches(source):
+    full = normalize_history(source.history)
+    last_cached = full.index[-6]
+    # Prices before a 2:1 split, and the split in the new bars
+    stale = full[full.index <= last_cached].assign(Close=lambda df: df.Close * 2)
+    write_entry('KO', stale, covered_from=None, fetched_at=pd.Timestamp.now() - pd.Timedelta('2h'))
+    source.history = source.history.copy()
+    source.history.iloc[-3, source.history.columns.get_loc('Stock Splits')] = 2.0
+
+    history = load_history('KO', '5y', source=source)
+    pd.testing.assert_frame_equal(history, expected(source, '5y'))
+    assert [call['period'] for call in source.calls] == [None, '5y']
+
+def test_period_coverage(source):
+    load_history('KO', '5y', source=source)
+    # Longer period than stored: full download
+    pd.testing.assert_frame_equal(load_history('KO', '10y', source=source), expected(source, '10y'))
+    assert [call['period'] for call in source.calls] == ['5y', '10y']
+
+    # Shorter period: served from the store
+    pd.testing.assert_frame_equal(load_history('KO', '2y', source=source), expected(source, '2y'))
+    assert len(source.calls) == 2
+
+    # max is only covered by a max download
+    pd.testing.assert_frame_equal(load_history('KO', 'max', source=source), normalize_history(source.history))
+    assert [call['period'] for call in source.calls] == ['5y', '10y', 'max']
+
+def test_float32_entries_are_downloaded_again(source):
+    history = normalize_history(source.history)
+    write_entry('KO', history.astype({'Close': np.float32}), covered_from=None, fetched_at=pd.Timestamp.now())
+
+    assert load_history('KO', '5y', source=source).Close.dtype == np.float64
+    assert source.calls == [{'period': '5y', 'start': None}]
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from history_cache import normalize_history
+from panel import panel_summary
+from utils import _compute_chart_data
+from synthetic import synthetic_history
+
+# Ticker -> (years, frequency), SHORT only has distributions in one calendar year
+TICKERS = {
+    'MONTHLY': (12, 'monthly'),
+    'QUARTERLY': (20, 'quarterly'),
+    'ANNUAL': (15, 'annual'),
+    'IRREGULAR': (10, 'irregular'),
+}
+
+def histories() -> dict[str, pd.DataFrame]:
+    histories = {
+        ticker: normalize_history(synthetic_history(years, frequency, seed=seed))
+        for seed, (ticker, (years, frequency)) in enumerate(TICKERS.items())
+    }
+    histories['SHORT'] = normalize_history(synthetic_history(1, 'quarterly', end='2026-12-31'))
+    return histories
+
+@pytest.fixture(scope='module')
+def summary() -> pd.DataFrame:
+    panel = pd.concat([
+        pd.DataFrame({
+            'ticker': ticker,
+            'date': history.index,
+            'close': history.Close.to_numpy(),
+            'dividend': history.Dividends.to_numpy(),
+        })
+        for ticker, history in histories().items()
+    ], ignore_index=True)
+    return panel_summary(panel).set_index('ticker')
+
+def test_short_distribution_history_is_left_out(summary):
+    assert sorted(summary.index) == sorted(TICKERS)
+
+@pytest.mark.parametrize('ticker', list(TICKERS))
+def test_matches_single_ticker(summary, ticker):
+    data = _compute_chart_data(ticker, 'max', histories()[ticker])
+    row = summary.loc[ticker]
+
+    assert row.date == data.history.Date.iloc[-1]
+    np.testing.assert_allclose(
+        [row.close, row.yearly_dividends, row.dividend_yield, row.drawdown, row.max_drawdown, row.yield_percentile],
+        [
+            data.stats['close'],
+            data.history.YearlyDividends.iloc[-1],
+            data.stats['dividend_yield'],
+            data.stats['drawdown'],
+            data.history.Drawdown.min(),
+            data.stats['yield_rank'],
+        ],
+        rtol=1e-12,
+    )
+    np.testing.assert_allclose(row[[f'yield_d{i}' for i in range(11)]].to_numpy(dtype=float), data.yields.deciles(), rtol=1e-12)
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils import YieldDistribution
+
+YIELDS = {
+    'one': [0.031],
+    'two': [0.042, 0.018],
+    'ties': [0.03, 0.02, 0.03, 0.05, 0.02, 0.03, 0.04, 0.02],
+    'random': list(np.random.default_rng(0).uniform(0.01, 0.08, 500)),
+}
+
+@pytest.mark.parametrize('name', list(YIELDS))
+def test_quantiles_match_pandas(name):
+    yields = pd.Series(YIELDS[name])
+    distribution = YieldDistribution(yields.sample(frac=1, random_state=0).to_numpy())
+    q = np.arange(0, 1.1, .1)
+
+    np.testing.assert_allclose(distribution.deciles(), yields.quantile(q).to_numpy(), rtol=1e-12)
+    assert distribution.median == pytest.approx(yields.median(), rel=1e-12)
+
+@pytest.mark.parametrize('name', list(YIELDS))
+def test_percentiles_match_pandas_rank(name):
+    yields = pd.Series(YIELDS[name])
+    distribution = YieldDistribution(yields.to_numpy())
+
+    np.testing.assert_allclose([distribution.percentile(value) for value in yields], yields.rank(pct=True).to_numpy(), rtol=1e-12)
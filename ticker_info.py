@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from storage import cache_path, safe_filename, read_json, write_json, CACHE_DIR
+from metrics import stage, count
+
+# Fields of yf.Ticker.info used to write tweets
+INFO_FIELDS = [
+    'symbol',
+    'quoteType',
+    'shortName',
+    'sector',
+    'industry',
+    'currency',
+    'marketCap',
+    'trailingPE',
+    'forwardPE',
+    'enterpriseToEbitda',
+    'priceToBook',
+    'dividendRate',
+    'dividendYield',
+    'totalAssets',
+    'holdings',
+    'equityHoldings',
+]
+
+# Ticker info changes at most daily
+INFO_MAX_AGE = float(os.environ.get('INFO_MAX_AGE', 12 * 60 * 60))
+INFO_CACHE_SIZE = 256
+
+CURRENCY_SYMBOLS = {
+    'EUR': '€',
+    'GBP': '£',
+    'CHF': 'CHF',
+}
+
+_memory_cache = OrderedDict()
+_memory_cache_lock = threading.Lock()
+
+def _info_path(ticker: str) -> str:
+    return cache_path('info', safe_filename(ticker) + '.json')
+
+def _remember(ticker: str, entry: dict):
+    with _memory_cache_lock:
+        _memory_cache[ticker] = entry
+        _memory_cache.move_to_end(ticker)
+        while len(_memory_cache) > INFO_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+def get_ticker_info(ticker: str, max_age: float=INFO_MAX_AGE) -> dict:
+    """
+    Returns the fields of yf.Ticker(ticker).info used by the bot.
+    Looks in memory, then on disk, and only calls yahoo finance when both are older than max_age.
+
+    Parameters:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - max_age: float
+        Maximum age of cached info, in seconds
+
+    Returns:
+    -------
+    - dict with the INFO_FIELDS available for this ticker
+    """
+    ticker = ticker.upper()
+    now = time.time()
+
+    with _memory_cache_lock:
+        entry = _memory_cache.get(ticker)
+    if entry is None:
+        entry = read_json(_info_path(ticker))
+    if entry is not None and now - entry['fetched_at'] <= max_age:
+        _remember(ticker, entry)
+        count('info_cache_hit')
+        return entry['info']
+
+    import yfinance as yf
+
+    count('info_cache_miss')
+    with stage('info_fetch'):
+        info = yf.Ticker(ticker).info
+    info = {field: info[field] for field in INFO_FIELDS if field in info}
+    # Do not cache answers for unknown tickers
+    if 'quoteType' in info:
+        entry = {'fetched_at': now, 'info': info}
+        _remember(ticker, entry)
+        write_json(_info_path(ticker), entry)
+    return info
+
+def purge_ticker_info(max_age: float=INFO_MAX_AGE):
+    """
+    Remove expired ticker info from disk.
+    """
+    folder = os.path.join(CACHE_DIR, 'info')
+    if not os.path.isdir(folder):
+        return
+    now = time.time()
+    for name in os.listdir(folder):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(folder, name)
+        entry = read_json(path)
+        if entry is None or now - entry.get('fetched_at', 0) > max_age:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def get_currency_symbol(info: dict) -> str:
+    """
+    Returns the symbol used in charts and tweets for the currency of a ticker.
+    """
+    return CURRENCY_SYMBOLS.get(info.get('currency'), '$')
@@ -0,0 +1,125 @@
+import datetime
+import tweepy
+from storage import cache_path, read_json, write_json
+
+TWITTER_DATE_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+def created_at(tweet: dict) -> datetime.datetime:
+    """
+    Returns the creation date of a tweet json.
+    """
+    return datetime.datetime.strptime(tweet['created_at'], TWITTER_DATE_FORMAT)
+
+def fetch_newer(fetch_page, since_id: int, oldest: datetime.datetime, max_tweets: int) -> list[dict]:
+    """
+    Page backwards from the most recent tweet until since_id, oldest date or max_tweets is reached.
+    """
+    tweets = []
+    max_id = None
+    while len(tweets) < max_tweets:
+        kwargs = {'since_id': since_id} if since_id else {}
+        if max_id:
+            kwargs['max_id'] = max_id
+        page = [t._json for t in fetch_page(**kwargs)]
+        if max_id:
+            # max_id is inclusive
+            page = [t for t in page if t['id'] < max_id]
+        if not page:
+            break
+        tweets += page
+        max_id = min(t['id'] for t in page)
+        if created_at(min(page, key=lambda t: t['id'])) < oldest:
+            break
+    return tweets
+
+def _list_timeline_path(list_id: str) -> str:
+    return cache_path(f'list_timeline_{list_id}.json')
+
+def collect_list_timeline(api: tweepy.API, list_id: str, max_age: datetime.timedelta=datetime.timedelta(days=1), max_tweets: int=500) -> list[dict]:
+    """
+    Returns the tweets of a list for the past max_age, as json.
+    Tweets already seen are kept in a local store, only tweets newer than the stored cursor are downloaded.
+
+    Parameters:
+    ----------
+    api: tweepy.API
+        API object to read timelines
+    list_id: str
+        Id of the twitter list
+    max_age: datetime.timedelta
+        Age of the oldest tweets to return
+    max_tweets: int
+        Maximum number of tweets downloaded per run
+
+    Returns:
+    -------
+    list of tweets as json dicts.
+    """
+    path = _list_timeline_path(list_id)
+    store = read_json(path, default={'since_id': None, 'tweets': []})
+    oldest = datetime.datetime.now(datetime.timezone.utc) - max_age
+
+    new_tweets = fetch_newer(
+        lambda **kwargs: api.list_timeline(list_id=list_id, count=200, include_rts=False, **kwargs),
+        since_id=store['since_id'],
+        oldest=oldest,
+        max_tweets=max_tweets,
+    )
+
+    # Merge with stored tweets, most recent version of each tweet wins
+    tweets = {t['id']: t for t in store['tweets']}
+    tweets.update({t['id']: t for t in new_tweets})
+    tweets = [t for t in tweets.values() if created_at(t) >= oldest]
+
+    write_json(path, {
+        'since_id': max([t['id'] for t in new_tweets], default=store['since_id']),
+        'tweets': tweets,
+    })
+    return tweets
+
+def mark_favorited(list_id: str, tweet_id: int):
+    """
+    Record in the store of a list that a tweet has been liked, so it is not returned as a candidate again.
+    """
+    path = _list_timeline_path(list_id)
+    store = read_json(path)
+    if store is None:
+        return
+    for tweet in store['tweets']:
+        if tweet['id'] == tweet_id:
+            tweet['favorited'] = True
+    write_json(path, store)
+
+def collect_replied_user_ids(api: tweepy.API, count: int=60) -> set[int]:
+    """
+    Returns ids of users replied to in the bot's most recent tweets.
+    The last tweets are kept in a local store, only newer tweets are downloaded.
+
+    Parameters:
+    ----------
+    api: tweepy.API
+        API object to read timelines
+    count: int
+        Number of most recent tweets to consider
+
+    Returns:
+    -------
+    set of user ids.
+    """
+    path = cache_path('own_tweets.json')
+    store = read_json(path, default={'since_id': None, 'tweets': []})
+
+    kwargs = {'since_id': store['since_id']} if store['since_id'] else {}
+    new_tweets = [
+        {'id': t.id, 'in_reply_to_user_id': t.in_reply_to_user_id}
+        for t in api.user_timeline(count=count, **kwargs)
+    ]
+
+    tweets = {t['id']: t for t in store['tweets'] + new_tweets}
+    tweets = sorted(tweets.values(), key=lambda t: t['id'], reverse=True)[:count]
+
+    write_json(path, {
+        'since_id': tweets[0]['id'] if tweets else None,
+        'tweets': tweets,
+    })
+    return {t['in_reply_to_user_id'] for t in tweets}
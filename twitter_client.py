@@ -0,0 +1,195 @@
+import contextlib
+import contextvars
+import datetime
+import math
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+import requests
+import tweepy
+from metrics import stage, count
+from scheduler import Deferred
+
+# Priority of the current work: replies are high priority, scheduled posts are low priority
+HIGH = 'high'
+LOW = 'low'
+# Share of each quota that low priority work leaves to high priority work
+LOW_PRIORITY_RESERVE = float(os.environ.get('LOW_PRIORITY_RESERVE', 0.2))
+# Base URL used instead of api.twitter.com and upload.twitter.com, such as a local fake server
+TWITTER_API_URL = os.environ.get('TWITTER_API_URL')
+# Delay before retrying an endpoint that answered 429 without reset header, in seconds
+DEFAULT_RESET_DELAY = 15 * 60
+
+TWITTER_HOSTS = ['https://api.twitter.com', 'https://upload.twitter.com']
+
+_priority = contextvars.ContextVar('twitter_priority', default=HIGH)
+
+@contextlib.contextmanager
+def priority(level: str):
+    """
+    Run a block of work with a priority (HIGH or LOW). Work is high priority by default.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> str:
+    return _priority.get()
+
+def endpoint_key(method: str, url: str) -> str:
+    """
+    Returns the key of an endpoint, such as 'GET statuses/mentions_timeline' or 'POST 2/tweets'.
+    """
+    path = urlsplit(url).path.strip('/')
+    if path.startswith('1.1/'):
+        path = path[len('1.1/'):]
+    if path.endswith('.json'):
+        path = path[:-len('.json')]
+    return f'{method.upper()} {path}'
+
+def _deferral(until: float, reason: str) -> Deferred:
+    count('rate_limit_deferrals')
+    return Deferred(datetime.datetime.fromtimestamp(until), reason)
+
+class RateLimiter:
+    """
+    Thread-safe sliding window limiter: at most max_calls per period (in seconds).
+    Low priority work cannot use the share of calls reserved to high priority work, and is deferred instead of waiting.
+    """
+    def __init__(self, max_calls: int, period: float, low_priority_reserve: float=LOW_PRIORITY_RESERVE):
+        self.max_calls = max_calls
+        self.period = period
+        self.low_priority_calls = max_calls - math.ceil(max_calls * low_priority_reserve)
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until a call is allowed, then record it.
+        Raises Deferred for low priority work instead of blocking.
+        """
+        low = current_priority() == LOW
+        with stage('rate_limit_wait'):
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    while self.calls and self.calls[0] <= now - self.period:
+                        self.calls.popleft()
+                    max_calls = self.low_priority_calls if low else self.max_calls
+                    if len(self.calls) < max_calls:
+                        self.calls.append(now)
+                        return
+                    delay = self.calls[len(self.calls) - max_calls] + self.period - now
+                if low:
+                    raise _deferral(time.time() + delay, 'Low priority share of the limiter is used')
+                time.sleep(delay)
+
+class RateBudget:
+    """
+    Remaining quota of each endpoint, read from the x-rate-limit-* headers of every response.
+    """
+    def __init__(self, low_priority_reserve: float=LOW_PRIORITY_RESERVE):
+        self.low_priority_reserve = low_priority_reserve
+        # endpoint key -> {'limit': int, 'remaining': int, 'reset': epoch seconds}
+        self.quotas = {}
+        self.lock = threading.Lock()
+
+    def update(self, endpoint: str, headers: dict):
+        """
+        Record the quota of an endpoint from response headers.
+        """
+        if 'x-rate-limit-remaining' not in headers:
+            return
+        quota = {
+            'limit': int(headers.get('x-rate-limit-limit', headers['x-rate-limit-remaining'])),
+            'remaining': int(headers['x-rate-limit-remaining']),
+            'reset': float(headers.get('x-rate-limit-reset', time.time() + DEFAULT_RESET_DELAY)),
+        }
+        with self.lock:
+            self.quotas[endpoint] = quota
+
+    def exhaust(self, endpoint: str) -> Deferred:
+        """
+        Mark an endpoint as exhausted after a 429 answer, returns the matching Deferred.
+        """
+        with self.lock:
+            quota = self.quotas.setdefault(endpoint, {'limit': 1, 'reset': time.time() + DEFAULT_RESET_DELAY})
+            quota['remaining'] = 0
+            return _deferral(quota['reset'], f'{endpoint} rate limit reached')
+
+    def reserve(self, endpoint: str):
+        """
+        Take one call from the quota of an endpoint.
+        Raises Deferred until the quota resets when no call is left for the current priority.
+        Endpoints without known quota are not limited.
+        """
+        now = time.time()
+        with self.lock:
+            quota = self.quotas.get(endpoint)
+            if quota is None or now >= quota['reset']:
+                return
+            reserved = math.ceil(quota['limit'] * self.low_priority_reserve) if current_priority() == LOW else 0
+            if quota['remaining'] - reserved < 1:
+                raise _deferral(quota['reset'], f'{endpoint} quota used until reset')
+            # Calls in flight are counted until their response updates the quota
+            quota['remaining'] -= 1
+
+    def response_hook(self, response: requests.Response, *args, **kwargs):
+        self.update(endpoint_key(response.request.method, response.url), response.headers)
+
+class BaseURLAdapter(requests.adapters.HTTPAdapter):
+    """
+    Send requests to another base URL, keeping their path and query.
+    """
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = urlsplit(base_url)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = urlunsplit((self.base_url.scheme, self.base_url.netloc, url.path, url.query, url.fragment))
+        return super().send(request, **kwargs)
+
+def _setup_session(session: requests.Session, budget: RateBudget, base_url: str):
+    session.hooks['response'].append(budget.response_hook)
+    if base_url:
+        for host in TWITTER_HOSTS:
+            session.mount(host, BaseURLAdapter(base_url))
+
+class BudgetedAPI(tweepy.API):
+    """
+    Twitter API v1.1 client checking the rate budget before each call, instead of sleeping when a limit is reached.
+    """
+    def __init__(self, auth, budget: RateBudget, base_url: str=TWITTER_API_URL, **kwargs):
+        super().__init__(auth, wait_on_rate_limit=False, **kwargs)
+        self.budget = budget
+        _setup_session(self.session, budget, base_url)
+
+    def request(self, method, endpoint, **kwargs):
+        key = endpoint_key(method, endpoint)
+        self.budget.reserve(key)
+        try:
+            return super().request(method, endpoint, **kwargs)
+        except tweepy.TooManyRequests:
+            raise self.budget.exhaust(key)
+
+class BudgetedClient(tweepy.Client):
+    """
+    Twitter API v2 client checking the rate budget before each call, instead of sleeping when a limit is reached.
+    """
+    def __init__(self, budget: RateBudget, base_url: str=TWITTER_API_URL, **kwargs):
+        super().__init__(wait_on_rate_limit=False, **kwargs)
+        self.budget = budget
+        _setup_session(self.session, budget, base_url)
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        key = endpoint_key(method, route)
+        self.budget.reserve(key)
+        try:
+            return super().request(method, route, params=params, json=json, user_auth=user_auth)
+        except tweepy.TooManyRequests:
+            raise self.budget.exhaust(key)
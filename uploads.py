@@ -0,0 +1,65 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import tweepy
+from metrics import stage, count
+from storage import cache_path, read_json, write_json
+
+# Images larger than this are sent with chunked uploads, in bytes
+CHUNKED_UPLOAD_MIN_BYTES = int(os.environ.get('CHUNKED_UPLOAD_MIN_BYTES', 1024 * 1024))
+# Uploaded media are attached again to new tweets for this long, in seconds (Twitter keeps them 24 hours)
+MEDIA_ID_TTL = float(os.environ.get('MEDIA_ID_TTL', 6 * 60 * 60))
+
+_media_ids_lock = threading.Lock()
+
+def _media_ids_path() -> str:
+    return cache_path('media_ids.json')
+
+def content_hash(png: bytes) -> str:
+    return hashlib.sha256(png).hexdigest()
+
+def upload_png(api: tweepy.API, png: bytes) -> int:
+    """
+    Upload a rendered chart from memory and returns its media_id.
+    A chart identical to one uploaded less than MEDIA_ID_TTL ago is not uploaded again, its media_id is reused.
+
+    Parameters:
+    ----------
+    - api: tweepy.API
+        API object to upload media
+    - png: bytes
+        PNG image of the chart
+
+    Returns:
+    -------
+    - int media_id to attach to a tweet
+    """
+    key = content_hash(png)
+    now = time.time()
+    with _media_ids_lock:
+        media_ids = read_json(_media_ids_path(), default={})
+    entry = media_ids.get(key)
+    if entry is not None and now < entry['expires_at']:
+        count('media_id_hit')
+        return entry['media_id']
+
+    count('media_id_miss')
+    with stage('upload'):
+        # The file name is only used to guess the media type
+        media = api.media_upload(
+            filename='chart.png',
+            file=io.BytesIO(png),
+            chunked=len(png) >= CHUNKED_UPLOAD_MIN_BYTES,
+            media_category='tweet_image',
+        )
+    # Keep a margin before the expiration announced by Twitter
+    ttl = min(MEDIA_ID_TTL, getattr(media, 'expires_after_secs', MEDIA_ID_TTL) / 2)
+
+    with _media_ids_lock:
+        media_ids = read_json(_media_ids_path(), default={})
+        media_ids = {k: v for k, v in media_ids.items() if now < v['expires_at']}
+        media_ids[key] = {'media_id': media.media_id, 'expires_at': now + ttl}
+        write_json(_media_ids_path(), media_ids)
+    return media.media_id
@@ -1,9 +1,12 @@
-import yfinance as yf
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 import pandas as pd
 import numpy as np
 import altair as alt
-import seaborn as sns
-import datetime
+import history_cache
+from downsample import downsample_chart_data
+from metrics import stage, count
 
 def streamlit_theme():
     font = "Lato"
@@ -200,9 +203,16 @@ def generate_tweet_ticker_details(info: dict, currency_symbol: str='$') -> list[
 
     return details
 
-def load_ticker_data(ticker: str, period: str) -> pd.DataFrame:
+def normalize_period(period: str) -> str:
+    """
+    Returns the yahoo finance period of a chart request (e.g. 15y).
+    """
+    return f"{int(period.split('y')[0])}y" if 'y' in period else period
+
+def load_ticker_data(ticker: str, period: str, source=history_cache.yahoo_history) -> pd.DataFrame:
     """
     Returns stock history from a ticker and a period.
+    History is read from the local store first, only missing bars are downloaded.
 
     Parameters:
     ----------
@@ -210,130 +220,332 @@ def load_ticker_data(ticker: str, period: str) -> pd.DataFrame:
         Ticker from yahoo finance
     - period: str
         Period to collect data from (ytd, 1wk, 1m, 6m, 1y, 10y, ..., max)
+    - source: callable
+        Data source used to fill the store (yahoo finance by default)
 
     Returns:
     -------
-    - pd.DataFrame containing stock historical data
+    - pd.DataFrame with a Date index, Close and Dividends columns
     """
-    return yf.Ticker(ticker).history(
-        period=period,
-        auto_adjust=False
-    )
+    return history_cache.load_history(ticker, period, source=source)
 
-def process_dividend_history(history: pd.DataFrame) -> pd.DataFrame:
-    # Get df with dividend distributions
-    dividends = history.loc[history.Dividends > 0, 'Dividends'].to_frame()
+# Number of distributions per year (index) -> distribution frequency used to annualize dividends
+ANNUAL_DIVIDEND_COUNT = np.array([0, 1, 2, 4, 4, 4, 4, 4, 4, 12, 12, 12, 12])
+
+def dividend_history_arrays(dates: np.ndarray, amounts: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Array based computation of dividend history metrics.
+
+    Parameters:
+    ----------
+    - dates: np.ndarray
+        Sorted datetime64 dates of the distributions
+    - amounts: np.ndarray
+        Amount distributed, same length as dates
+
+    Returns:
+    -------
+    - dict of arrays: Date, Dividends, AnnualDividendCount, SmoothedDividends, YearlyDividends, DivGrowth
+    """
+    dates = np.asarray(dates)
+    amounts = np.asarray(amounts, dtype=float)
 
     # Keep one distribution per month
-    dividends['Month'] = dividends.index.to_period('1M')
-    dividends = (dividends
-        .reset_index()
-        .groupby('Month', as_index=False)
-        .first()
-        .set_index('Date')
-        .drop(columns=['Month'])
-    )
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    first_in_month = np.empty(len(months), dtype=bool)
+    first_in_month[:1] = True
+    first_in_month[1:] = months[1:] != months[:-1]
+    dates = dates[first_in_month]
+    amounts = amounts[first_in_month]
 
     # Count distributions per year
-    yearly_distributions = dividends.groupby(dividends.index.year).Dividends.count()
+    years = dates.astype('datetime64[Y]').astype(np.int64)
+    unique_years, year_index, yearly_distributions = np.unique(years, return_inverse=True, return_counts=True)
     # First and current year do not have all distributions, use next and previous year's numbers
-    yearly_distributions.iloc[0] = yearly_distributions.iloc[1]
-    yearly_distributions.iloc[-1] = yearly_distributions.iloc[-2]
-    # Map values
-    dividends['AnnualDividendCount'] = dividends.index.year.map(yearly_distributions)
-    dividends['AnnualDividendCount'] = pd.cut(
-        dividends.AnnualDividendCount,
-        bins=[-np.inf, 0, 1, 2, 3, 4, 8, 12],
-        labels=[0, 1, 2, 4, 4, 4, 12],
-        ordered=False,
-    ).astype(int)
-
-    dividends['SmoothedDividends'] = (dividends
-        .Dividends
-        .rolling(5, center=True)
-        .median()
-    )
-    # ).bfill().ffill()
-    dividends['SmoothedDividends'] = dividends.SmoothedDividends.combine_first(dividends.Dividends)
-    # dividends['YearlyDividends'] = dividends.SmoothedDividends * dividends.AnnualDividendCount
-
-    dividends['YearlyDividends']= np.where(
-        dividends.AnnualDividendCount <= 3, 
-        dividends.index.year.map(dividends.groupby(dividends.index.year).Dividends.sum()),
-        dividends.SmoothedDividends * dividends.AnnualDividendCount
+    yearly_distributions[0] = yearly_distributions[1]
+    yearly_distributions[-1] = yearly_distributions[-2]
+    annual_count = ANNUAL_DIVIDEND_COUNT[yearly_distributions[year_index]]
+
+    # Centered rolling median over 5 distributions, raw amounts on the edges
+    smoothed = amounts.copy()
+    if len(amounts) >= 5:
+        windows = np.lib.stride_tricks.sliding_window_view(amounts, 5)
+        smoothed[2:-2] = np.median(windows, axis=1)
+
+    yearly_sums = np.bincount(year_index, weights=amounts)
+    yearly = np.where(
+        annual_count <= 3,
+        yearly_sums[year_index],
+        smoothed * annual_count
     )
 
     # Get at least one full year
-    dividends = dividends.loc[dividends.index > dividends.index[0] + datetime.timedelta(days=365)]
+    keep = dates > dates[0] + np.timedelta64(365, 'D')
+
+    return {
+        'Date': dates[keep],
+        'Dividends': amounts[keep],
+        'AnnualDividendCount': annual_count[keep],
+        'SmoothedDividends': smoothed[keep],
+        'YearlyDividends': yearly[keep],
+        # Growth in dividends since beginning of timeframe
+        'DivGrowth': yearly[keep] / yearly[keep][0] - 1,
+    }
+
+def process_dividend_history(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns dividend distributions with their annualized amount.
+
+    Parameters:
+    ----------
+    - history: pd.DataFrame
+        Stock history with a Dividends column and a Date index
+
+    Returns:
+    -------
+    - pd.DataFrame with Date, Dividends, AnnualDividendCount, SmoothedDividends, YearlyDividends, DivGrowth
+    """
+    # Get distributions
+    dividends = history.loc[history.Dividends > 0, 'Dividends']
+    dates = dividends.index
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+
+    dividends = pd.DataFrame(dividend_history_arrays(dates.to_numpy(), dividends.to_numpy()))
+    if history.index.tz is not None:
+        dividends['Date'] = dividends.Date.dt.tz_localize(history.index.tz)
 
-    # Growth in dividends since beginning of timeframe
-    dividends['DivGrowth'] = dividends['YearlyDividends'] / dividends['YearlyDividends'].iloc[0] - 1
-    dividends = dividends.reset_index()
-    
     return dividends
 
-def generate_dividend_chart(ticker, period, currency_symbol='$'):
-    # Load historical data
-    history = load_ticker_data(
-        ticker=ticker,
-        period=f"{int(period.split('y')[0])}y" if 'y' in period else period
-    )
+class YieldDistribution:
+    """
+    Dividend yields of a period, sorted once.
+    Quantiles are read by position and percentiles found by binary search, without sorting again.
+
+    Parameters:
+    ----------
+    - yields: np.ndarray
+        Dividend yields, in any order
+    """
+    def __init__(self, yields: np.ndarray):
+        self.sorted = np.sort(np.asarray(yields, dtype=float))
+
+    def quantile(self, q):
+        """
+        Quantile(s) with linear interpolation, same as pd.Series.quantile.
+        """
+        position = np.asarray(q, dtype=float) * (len(self.sorted) - 1)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, len(self.sorted) - 1)
+        return self.sorted[lower] + (self.sorted[upper] - self.sorted[lower]) * (position - lower)
+
+    @property
+    def median(self) -> float:
+        return float(self.quantile(0.5))
+
+    def deciles(self) -> np.ndarray:
+        """
+        Yields at 0%, 10%, ..., 100% of the distribution.
+        """
+        return self.quantile(np.arange(0, 1.1, .1))
+
+    def percentile(self, value: float) -> float:
+        """
+        Share of the period with a lower yield, ties counted by half, same as rank(pct=True) of a member of the distribution.
+        """
+        below = np.searchsorted(self.sorted, value, side='left')
+        below_or_equal = np.searchsorted(self.sorted, value, side='right')
+        return (below + (below_or_equal - below + 1) / 2) / len(self.sorted)
+
+@dataclass
+class DividendChartData:
+    """
+    Result of the computation stage of a dividend chart, independent from rendering.
+
+    Attributes:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - period: str
+        Period of the chart
+    - history: pd.DataFrame
+        Date, Close, YearlyDividends, DividendYield, Drawdown from the first dividend
+    - bands: pd.DataFrame
+        Date and price level of each dividend yield decile
+    - stats: dict
+        Summary statistics used for text and scales
+    - yields: YieldDistribution
+        Dividend yields of the period, for further decile and percentile queries
+    """
+    ticker: str
+    period: str
+    history: pd.DataFrame
+    bands: pd.DataFrame
+    stats: dict
+    yields: YieldDistribution
+
+# d3-format definition of the default number locale, the currency is set per chart
+NUMBER_LOCALE = {
+    'decimal': '.',
+    'thousands': ',',
+    'grouping': [3],
+}
+
+def number_locale(currency_symbol: str='$') -> dict:
+    """
+    Returns the d3-format number locale of a currency, with the symbol after amounts for € and CHF.
+    """
+    if currency_symbol in ['€', 'CHF']:
+        currency = ['', f'\u00a0{currency_symbol}']
+    else:
+        currency = [f'\u00a0{currency_symbol}', '']
+    return {**NUMBER_LOCALE, 'currency': currency}
 
+# Colors of the yield decile bands: seaborn color_palette("vlag_r", 10).as_hex()
+DECILE_PALETTE = [
+    '#b95b5a', '#c87e7b', '#d7a09d', '#e6c5c3', '#f7eae8',
+    '#efeef1', '#cad0dd', '#a3b4cd', '#7e9ac2', '#5782bc',
+]
+
+# Computed chart data, keyed by (ticker, period, last bar date)
+CHART_DATA_CACHE_SIZE = 64
+_chart_data_cache = OrderedDict()
+_chart_data_cache_lock = threading.Lock()
+
+# Yearly dividends are carried forward for at most this many bars after a distribution
+DIVIDEND_FILL_LIMIT = 300
+
+def _compute_chart_data(ticker: str, period: str, history: pd.DataFrame) -> DividendChartData:
     dividends = process_dividend_history(history)
 
-    # Merge dividends with price history
-    df = pd.merge(
-        left=history.reset_index(),
-        right=dividends.drop(columns=['Dividends']),
-        on='Date',
-        how='left'
-    ).ffill(limit=300).fillna(0)
+    dates = history.index.to_numpy()
+    close = history.Close.to_numpy(dtype=float)
+    bars = np.arange(len(dates))
 
-    df['Drawdown'] = df.Close / df.Close.cummax() - 1
+    # Carry yearly dividends forward from each distribution bar
+    distribution_bars = np.searchsorted(dates, dividends.Date.to_numpy())
+    last_distribution = np.full(len(dates), -1)
+    last_distribution[distribution_bars] = distribution_bars
+    last_distribution = np.maximum.accumulate(last_distribution)
+    bar_dividends = np.zeros(len(dates) + 1)
+    bar_dividends[distribution_bars] = dividends.YearlyDividends.to_numpy()
+    # Index -1 points to the trailing zero
+    yearly = np.where(bars - last_distribution <= DIVIDEND_FILL_LIMIT, bar_dividends[last_distribution], 0)
 
-    # Keep data from first dividend
-    index_first_dividend = df[df.YearlyDividends > 0].index[0]
-    df = df.loc[index_first_dividend:]
+    drawdown = close / np.maximum.accumulate(close) - 1
 
-    # Drop where dividends is null
-    df = df[df.YearlyDividends.notna()]
-    # Calculate dividend yield base on TTM distributions
-    df['DividendYield'] = df.YearlyDividends / df.Close
+    # Keep data from first dividend
+    first = np.flatnonzero(yearly > 0)[0]
+    df = pd.DataFrame({
+        'Date': dates[first:],
+        'Close': close[first:],
+        'YearlyDividends': yearly[first:],
+        # Calculate dividend yield base on TTM distributions
+        'DividendYield': yearly[first:] / close[first:],
+        'Drawdown': drawdown[first:],
+    })
 
     # Calculate quantiles of dividend yield
-    quantiles = df.DividendYield.quantile(q=np.arange(0, 1.1, .1))
-    yield_df = pd.DataFrame(df.YearlyDividends.to_numpy()[:, None] / quantiles.to_numpy(), index=df.Date)
-    yield_df.columns = [f"{decile * 10}%" for decile in yield_df.columns[::-1]]
-    yield_df = yield_df.reset_index()
+    yields = YieldDistribution(df.DividendYield.to_numpy())
+    bands = pd.DataFrame(df.YearlyDividends.to_numpy()[:, None] / yields.deciles(), index=df.Date)
+    bands.columns = [f"{decile * 10}%" for decile in bands.columns[::-1]]
+    bands = bands.reset_index()
+
+    median_yield = yields.median
+    stats = {
+        'close': df.Close.iloc[-1],
+        'close_min': df.Close.min(),
+        'close_max': df.Close.max(),
+        'dividend_yield': df.DividendYield.iloc[-1],
+        'median_yield': median_yield,
+        'yield_rank': yields.percentile(df.DividendYield.iloc[-1]),
+        'upside_downside': df.DividendYield.iloc[-1] / median_yield,
+        'drawdown': df.Drawdown.iloc[-1],
+        'years': df.Date.dt.year.max() - df.Date.dt.year.min() + 1,
+    }
+    return DividendChartData(ticker=ticker, period=period, history=df, bands=bands, stats=stats, yields=yields)
 
-    # Set locale options
-    if currency_symbol in ['€', 'CHF']:
-        alt.renderers.set_embed_options(
-            formatLocale={ 
-                'currency': ['', f'\u00a0{currency_symbol}']
-            }
-        )
-    else:
-        alt.renderers.set_embed_options(
-            formatLocale={
-                'currency': [f'\u00a0{currency_symbol}', '']
-            }
-        )
+def compute_dividend_chart(ticker: str, period: str, history: pd.DataFrame=None) -> DividendChartData:
+    """
+    Computation stage of a dividend chart: load history, merge dividends, compute yields and bands.
+    Results are cached per (ticker, period, last bar date), so charts for the same data are only computed once.
+
+    Parameters:
+    ----------
+    - ticker: str
+        Ticker from yahoo finance
+    - period: str
+        Period of the chart (15y, 20y, max, ...)
+    - history: pd.DataFrame
+        History already loaded by load_ticker_data for this ticker and period, loaded here when None
+
+    Returns:
+    -------
+    - DividendChartData
+    """
+    period = normalize_period(period)
+    # Load historical data
+    if history is None:
+        history = load_ticker_data(ticker=ticker, period=period)
+
+    key = (ticker.upper(), period, history.index[-1] if len(history) else None)
+    with _chart_data_cache_lock:
+        if key in _chart_data_cache:
+            _chart_data_cache.move_to_end(key)
+            count('chart_data_cache_hit')
+            return _chart_data_cache[key]
+
+    with stage('process'):
+        data = _compute_chart_data(ticker, period, history)
+
+    with _chart_data_cache_lock:
+        _chart_data_cache[key] = data
+        while len(_chart_data_cache) > CHART_DATA_CACHE_SIZE:
+            _chart_data_cache.popitem(last=False)
+    return data
+
+def render_dividend_chart(data: DividendChartData, currency_symbol: str='$') -> alt.VConcatChart:
+    """
+    Rendering stage of a dividend chart: build the Altair chart from computed data.
+
+    Parameters:
+    ----------
+    - data: DividendChartData
+        Output of compute_dividend_chart
+    - currency_symbol: str
+        Symbol for ticker currency
+
+    Returns:
+    -------
+    - alt.VConcatChart
+    """
+    df = data.history
+    yield_df = data.bands
+    stats = data.stats
 
     # Create color palette and scale for legend
-    palette = sns.color_palette("vlag_r", len(quantiles)-1).as_hex()
-    scale = alt.Scale(domain=yield_df.columns[1:-1].tolist(), range=palette)
+    scale = alt.Scale(domain=yield_df.columns[1:-1].tolist(), range=DECILE_PALETTE)
 
 
-    upside_downside = df.DividendYield.iloc[-1] / df.DividendYield.quantile(q=0.5)
+    upside_downside = stats['upside_downside']
     if upside_downside > 1: 
-        upside_downside_str = f'{upside_downside - 1: .0%} upside to median yield (~{currency_symbol}{upside_downside * df.Close.iloc[-1]:.0f}).'
+        upside_downside_str = f'{upside_downside - 1: .0%} upside to median yield (~{currency_symbol}{upside_downside * stats["close"]:.0f}).'
     else:
-        upside_downside_str = f'{upside_downside - 1: .0%} downside to median yield (~{currency_symbol}{upside_downside * df.Close.iloc[-1]:.0f}).'
+        upside_downside_str = f'{upside_downside - 1: .0%} downside to median yield (~{currency_symbol}{upside_downside * stats["close"]:.0f}).'
+
+    # Prices, yields and bands share the same dates: all layers inherit one top-level dataset
+    # instead of embedding a copy each
+    chart_data = pd.concat([df, yield_df.drop(columns=['Date'])], axis=1)
+    # About one point per pixel is drawn, the last bar stays exact for the text marks
+    chart_data = downsample_chart_data(
+        chart_data,
+        series=['Close', 'DividendYield', 'Drawdown'],
+        keep_extremes=['Close', 'DividendYield', 'Drawdown'],
+    )
 
     # Create layers for chart
-    def make_layer(yield_df, col1, col2):
-        return alt.Chart(yield_df.assign(color=col1)).mark_area().encode(
+    def make_layer(col1, col2):
+        return alt.Chart().transform_calculate(color=f"'{col1}'").mark_area().encode(
             x=alt.X(
                 'Date:T',
                 title='',
@@ -344,7 +556,7 @@ def generate_dividend_chart(ticker, period, currency_symbol='$'):
                 f"{col1}:Q",
                 title=f'Price: {upside_downside_str}',
                 axis=alt.Axis(format='$.0f'),
-                scale=alt.Scale(zero=False, domain=[df.Close.min()*0.9, df.Close.max()*1.15], clamp=True),
+                scale=alt.Scale(zero=False, domain=[stats['close_min']*0.9, stats['close_max']*1.15], clamp=True),
             ),
             y2=alt.Y2(
                 f"{col2}:Q",
@@ -365,9 +577,9 @@ def generate_dividend_chart(ticker, period, currency_symbol='$'):
 
     layers=[]
     for col1, col2 in zip(yield_df.columns[1:-1], yield_df.columns[2:]):
-        layers.append(make_layer(yield_df, col1, col2))
+        layers.append(make_layer(col1, col2))
 
-    price = alt.Chart(df).mark_line(color="white").encode(
+    price = alt.Chart().mark_line(color="white").encode(
         x=alt.X(
             'Date:T',
             axis=alt.Axis(
@@ -401,17 +613,17 @@ def generate_dividend_chart(ticker, period, currency_symbol='$'):
             'DividendYield:Q',
             axis=alt.Axis(format='.1%',),
             scale=alt.Scale(zero=False),
-            title=f'Dividend yield: higher than {df.DividendYield.rank(pct=True).iloc[-1]:.0%} of the period (median {df.DividendYield.quantile(q=0.5):.2%}).'
+            title=f'Dividend yield: higher than {stats["yield_rank"]:.0%} of the period (median {stats["median_yield"]:.2%}).'
         )
     )
-    median_yield = price.mark_rule(
+    # Median of the full period, not of the points drawn: a single rule from a precomputed value
+    median_yield = alt.Chart(alt.Data(values=[{}])).mark_rule(
         color='white',
         strokeDash=[16, 16],
         strokeWidth=.5
         # opacity=.5,
     ).encode(
-        x=alt.X(),
-        y='median(DividendYield):Q'
+        y=alt.datum(stats['median_yield'])
     )
      
     yield_text = price_text.encode(
@@ -442,7 +654,7 @@ def generate_dividend_chart(ticker, period, currency_symbol='$'):
         text=alt.Text('Drawdown:Q', format='.0%')
     )
 
-    percentile = int((1 - df.DividendYield.rank(pct=True).iloc[-1]) * 100)
+    percentile = int((1 - stats['yield_rank']) * 100)
     def format_percentile(percentile):
         if (4 <= percentile <= 20) or (percentile % 10 not in [1, 2, 3]):
             return str(percentile) + 'th'
@@ -477,13 +689,20 @@ def generate_dividend_chart(ticker, period, currency_symbol='$'):
         price_chart,
         (yield_chart + yield_text + median_yield),
         (drawdown_chart + drawdown_text),
-        spacing=0
+        spacing=0,
+        data=chart_data
     )
     chart = chart.properties(
-        title=f"""Ticker: {ticker}  •  Period: {df.Date.dt.year.max() - df.Date.dt.year.min() + 1}y"""
+        title=f"""Ticker: {data.ticker}  •  Period: {stats['years']}y"""
     )
     chart = chart.configure(
-        font='Lato'
+        font='Lato',
+        # Currency formats are part of the spec: charts in different currencies can be built concurrently
+        locale={'number': number_locale(currency_symbol)}
     )
     
     return chart
+
+def generate_dividend_chart(ticker, period, currency_symbol='$'):
+    data = compute_dividend_chart(ticker, period)
+    return render_dividend_chart(data, currency_symbol)